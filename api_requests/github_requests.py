@@ -1,81 +1,349 @@
 import json
 import logging
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from api_requests.rate_limit import TokenPool, is_rate_limit_response
+from cache.stats_cache import LocalCache
+from metrics.metrics import github_rate_limit_remaining, github_request_duration, registry
 
 logger = logging.getLogger(__name__)
 
-def get_events(repo: str) -> tuple:
-    """
-    Fetches events for a given GitHub repository using the GitHub API.
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+EVENTS_PER_PAGE = 100
+MAX_EVENTS_PAGES = 10
+REPO_CACHE_SIZE = 10000
 
-    This function retrieves the latest events for a specified GitHub repository. 
-    If the API rate limit is exceeded (HTTP status 429), it retries the request 
-    with an exponential backoff mechanism.
+def load_github_tokens(config_path: str = './config.json') -> list:
+    """
+    Loads the GitHub access tokens from the `GITHUB_ACCESS_TOKENS` (comma separated)
+    or `GITHUB_ACCESS_TOKEN` environment variables, or from the `github_access_tokens`
+    and `github_access_token` fields of the config file if they are not set.
 
     Args:
-        repo (str): The full name of the repository in the format 'owner/repo'.
+        config_path (str): The path to the config file.
 
     Returns:
-        tuple: A tuple containing:
-            - A JSON response (dict) with the events or an error message.
-            - An HTTP status code (int).
+        list: The tokens, empty if there are none.
     """
-    url = f'https://api.github.com/repos/{repo}/events'
-    with open('./config.json', 'r') as f:
-        github_token = (json.load(f))["github_access_token"]
-    headers = {
-        'Authorization': f'Bearer {github_token}',
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    tokens = os.getenv('GITHUB_ACCESS_TOKENS', '').split(',') + [os.getenv('GITHUB_ACCESS_TOKEN', '')]
+    if not any(tokens) and os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        tokens = config.get("github_access_tokens", []) + [config.get("github_access_token", '')]
+    return list(dict.fromkeys(token.strip() for token in tokens if token and token.strip()))
+
+
+class GitHubClient:
+    """
+    A long-lived GitHub API client.
+
+    The client keeps one `requests.Session` with a pool of keep-alive connections,
+    so repeated requests reuse TLS connections instead of opening a new one each time,
+    and holds the access tokens loaded once at startup. Every request uses the token
+    with the most requests left, and its response updates the rate limit state of
+    that token in `rate_limit`. Whether a repository exists is cached for
+    `repo_cache_ttl` seconds.
+
+    Args:
+        base_url (str): The GitHub API URL.
+        tokens (list | None): The GitHub access tokens, requests are anonymous without them.
+        timeout (float): The connect and read timeout of every request, in seconds.
+        pool_size (int): The maximum number of kept connections.
+        repo_cache_ttl (float): How long the existence of a repository is cached, in seconds.
+    """
+
+    def __init__(self, base_url: str = GITHUB_API_URL, tokens: list | None = None,
+                 timeout: float = 10, pool_size: int = 10, repo_cache_ttl: float = 3600):
+        self.configure(base_url=base_url, tokens=tokens, timeout=timeout, pool_size=pool_size,
+                       repo_cache_ttl=repo_cache_ttl)
+
+    def init_app(self, app) -> None:
+        self.configure(
+            base_url=app.config['GITHUB_API_URL'],
+            tokens=load_github_tokens(),
+            timeout=app.config['GITHUB_TIMEOUT'],
+            pool_size=max(app.config['SYNC_MAX_WORKERS'], 10),
+            repo_cache_ttl=app.config['GITHUB_REPO_CACHE_TTL'],
+        )
+
+    def configure(self, base_url: str, tokens: list | None, timeout: float, pool_size: int,
+                  repo_cache_ttl: float = 3600) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.repo_cache = LocalCache(REPO_CACHE_SIZE)
+        self.repo_cache_ttl = repo_cache_ttl
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers['Accept'] = 'application/vnd.github+json'
+        self.rate_limit = TokenPool(tokens)
+        self._metrics_lock = threading.Lock()
+        self._requests_count = 0
+
+    def request(self, path: str, headers: dict | None = None, endpoint: str = 'other') -> requests.Response:
+        """
+        Makes a GET request to the GitHub API with the token that has the most requests left.
+
+        Args:
+            path (str): The path of the API endpoint, or an absolute URL such as a `Link` header one.
+            headers (dict | None): Additional request headers.
+            endpoint (str): The name of the API endpoint in the request duration metric.
+        """
+        url = path if path.startswith(('http://', 'https://')) else f'{self.base_url}{path}'
+        with self._metrics_lock:
+            self._requests_count += 1
+        token, governor = self.rate_limit.acquire()
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            github_request_duration.observe(time.perf_counter() - start, endpoint=endpoint, status='error')
+            raise
+        github_request_duration.observe(time.perf_counter() - start, endpoint=endpoint, status=response.status_code)
+        governor.update(response.status_code, response.headers, response.text if response.status_code == 403 else '')
+        return response
+
+    def get_connection_metrics(self) -> dict:
+        """
+        Returns how many requests were made and how many connections had to be opened
+        for them, the rest of the requests reused a kept connection.
+
+        Returns:
+            dict: A dict with the `requests`, `connections` and `reused_connections` counts.
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        return {
+            "requests": self._requests_count,
+            "connections": connections,
+            "reused_connections": max(self._requests_count - connections, 0),
+        }
+
+    def get_events(self, repo: str, etag: str | None = None, last_modified: str | None = None,
+                   last_event_id: int | None = None) -> tuple:
+        """
+        Fetches events for a given GitHub repository using the GitHub API.
+
+        This function retrieves the events of a specified GitHub repository that are newer
+        than `last_event_id`, following the `Link` pagination of the API until it reaches
+        an already known event, so a quiet repository costs one request and a busy one
+        loses no events between synchronizations. Without `last_event_id`, all the
+        available pages are read.
+
+        If the rate limit is reached, no request is made until it is lifted, and the
+        caller gets HTTP status 429 to retry the repository later, as when GitHub refuses
+        a request because of the primary or a secondary rate limit. A failure on any page
+        fails the whole fetch, so that the caller never skips the events in between.
+
+        When `etag` or `last_modified` from a previous response are given, the request
+        is made conditional. GitHub answers with HTTP status 304 and no body if nothing
+        has changed since, and such responses do not count against the rate limit.
+
+        Args:
+            repo (str): The full name of the repository in the format 'owner/repo'.
+            etag (str | None): The `ETag` header of the previous response.
+            last_modified (str | None): The `Last-Modified` header of the previous response.
+            last_event_id (int | None): The ID of the newest event already saved.
+
+        Returns:
+            tuple: A tuple containing:
+                - A list with the new events (dict) or an error message, or None for 304.
+                - An HTTP status code (int).
+                - A dict with the `etag`, `last_modified` and `poll_interval` (in seconds)
+                  of the first page, any of which may be None.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        events = []
+        path = f'/repos/{repo}/events?per_page={EVENTS_PER_PAGE}'
+        cache_headers = None
+        for _ in range(MAX_EVENTS_PAGES):
+            if self.rate_limit.is_blocked():
+                return {"error": "GitHub rate limit reached"}, 429, get_cache_headers(None)
+
+            response = self.request(path, headers=headers, endpoint='events')
+            if cache_headers is None:
+                cache_headers = get_cache_headers(response)
+            if response.status_code == 304:
+                return None, 304, cache_headers
+            elif is_rate_limit_response(response.status_code, response.headers, response.text):
+                return {"error": "GitHub rate limit reached"}, 429, cache_headers
+            elif response.status_code != 200:
+                return response.json(), response.status_code, cache_headers
+
+            page = response.json()
+            new_events = [event for event in page if last_event_id is None or int(event['id']) > last_event_id]
+            events.extend(new_events)
+            if len(new_events) < len(page) or 'next' not in response.links:
+                break
+            path = response.links['next']['url']
+            headers = {}
+
+        return events, 200, cache_headers
+
+    def check_repo_existance(self, repo_name: str) -> bool:
+        """
+        Checks if a public GitHub repository exists using the GitHub API.
+
+        This function validates the existence of a repository by sending a request
+        to the GitHub API. It returns `True` if the repository exists and `False`
+        if it does not. Raises an exception for unexpected errors. The answer is
+        cached, so checking the same repository again makes no request until it expires.
+
+        Args:
+            repo_name (str): The full name of the repository in the format 'owner/repo'.
+
+        Returns:
+            bool:
+                - `True` if the repository exists.
+                - `False` if the repository does not exist (HTTP status 404).
+
+        Raises:
+            HTTPError: If the API response is an unexpected error other than 404.
+        """
+        exists = self.repo_cache.get(repo_name)
+        if exists is not None:
+            return exists
+
+        response = self.request(f'/repos/{repo_name}', endpoint='repository')
 
-    max_retries = 5
-    delay = 1
-    
-    for _ in range(max_retries):
-        response = requests.get(url, headers=headers)
         if response.status_code == 200:
-            return response.json(), 200
-        elif response.status_code == 429:
-            logger.info(f"Too many requests for '{repo}', retrying in {delay} seconds...")
-            time.sleep(delay)
-            delay *= 2
+            exists = True
+        elif response.status_code == 404:
+            exists = False
         else:
-            return response.json(), response.status_code
+            response.raise_for_status()
+            return None
+        self.repo_cache.set(repo_name, exists, self.repo_cache_ttl)
+        return exists
 
-    return {"error": "Failed to fetch events after retries"}, 429
+    def check_repos_existance(self, repo_names: list, max_workers: int) -> dict:
+        """
+        Checks if many public GitHub repositories exist at once using a bounded thread pool,
+        see `check_repo_existance`.
 
-def check_repo_existance(repo_name: str) -> bool:
+        Args:
+            repo_names (list): The full names of the repositories in the format 'owner/repo'.
+            max_workers (int): The maximum number of requests in flight at the same time.
+
+        Returns:
+            dict: A dictionary where keys are repository names, and values are True if
+                  the repository exists, False if it does not, and None if it could not
+                  be checked.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.check_repo_existance, repo_name): repo_name for repo_name in repo_names}
+            for future in as_completed(futures):
+                repo_name = futures[future]
+                try:
+                    results[repo_name] = future.result()
+                except requests.RequestException as error:
+                    logger.error(f'Error while checking repository {repo_name}: {error}')
+                    results[repo_name] = None
+        return results
+
+
+github_client = GitHubClient()
+
+def get_events(repo: str, etag: str | None = None, last_modified: str | None = None,
+               last_event_id: int | None = None) -> tuple:
     """
-    Checks if a public GitHub repository exists using the GitHub API.
+    Fetches events for a given GitHub repository with the shared client, see `GitHubClient.get_events`.
+    """
+    return github_client.get_events(repo, etag=etag, last_modified=last_modified, last_event_id=last_event_id)
 
-    This function validates the existence of a repository by sending a request
-    to the GitHub API. It returns `True` if the repository exists and `False` 
-    if it does not. Raises an exception for unexpected errors.
+def get_cache_headers(response: requests.Response | None) -> dict:
+    """
+    Extracts the headers used for conditional requests and polling from a GitHub response.
 
     Args:
-        repo_name (str): The full name of the repository in the format 'owner/repo'.
+        response (requests.Response | None): The response, or None if there is none.
 
     Returns:
-        bool: 
-            - `True` if the repository exists.
-            - `False` if the repository does not exist (HTTP status 404).
-
-    Raises:
-        HTTPError: If the API response is an unexpected error other than 404.
+        dict: A dict with the `etag` (str), `last_modified` (str) and `poll_interval`
+              (int, in seconds) of the response. Missing values are None.
     """
-    url = f"https://api.github.com/repos/{repo_name}"
-    headers = {
-        "Accept": "application/vnd.github.v3+json"
+    if response is None:
+        return {"etag": None, "last_modified": None, "poll_interval": None}
+
+    poll_interval = response.headers.get('X-Poll-Interval')
+    return {
+        "etag": response.headers.get('ETag'),
+        "last_modified": response.headers.get('Last-Modified'),
+        "poll_interval": int(poll_interval) if poll_interval and poll_interval.isdigit() else None,
     }
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        return True
-    elif response.status_code == 404:
-        return False
-    else:
-        response.raise_for_status()
+
+def get_events_concurrently(repos: dict, max_workers: int) -> Iterator[tuple]:
+    """
+    Fetches events for many GitHub repositories at once using a bounded thread pool.
+
+    Results are yielded in completion order, so the caller can save the events
+    of one repository while the others are still being fetched. A slow or
+    rate-limited repository only occupies one worker instead of the whole sync.
+
+    Args:
+        repos (dict): A mapping of repository full names in the format 'owner/repo'
+                      to the keyword arguments (`etag`, `last_modified`, `last_event_id`)
+                      for `get_events`.
+        max_workers (int): The maximum number of requests in flight at the same time.
+
+    Yields:
+        tuple: A tuple containing:
+            - The full name of the repository (str).
+            - A list with the new events (dict) or an error message, or None for 304.
+            - An HTTP status code (int).
+            - A dict with the cache headers of the response, see `get_events`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_events, repo, **kwargs): repo for repo, kwargs in repos.items()}
+        try:
+            for future in as_completed(futures):
+                repo = futures[future]
+                try:
+                    response, status_code, cache_headers = future.result()
+                except requests.RequestException as error:
+                    response, status_code, cache_headers = {"error": str(error)}, 503, get_cache_headers(None)
+                yield repo, response, status_code, cache_headers
+        finally:
+            # The requests that have not started are dropped if the caller stops early
+            for future in futures:
+                future.cancel()
+
+def check_repo_existance(repo_name: str) -> bool:
+    """
+    Checks if a public GitHub repository exists with the shared client, see `GitHubClient.check_repo_existance`.
+    """
+    return github_client.check_repo_existance(repo_name)
+
+def check_repos_existance(repo_names: list, max_workers: int) -> dict:
+    """
+    Checks if many public GitHub repositories exist with the shared client, see `GitHubClient.check_repos_existance`.
+    """
+    return github_client.check_repos_existance(repo_names, max_workers)
+
+def update_rate_limit_metrics() -> None:
+    """
+    Sets the remaining GitHub rate limit metric from the state of the shared client.
+    """
+    github_rate_limit_remaining.clear()
+    for token, state in github_client.rate_limit.get_state().items():
+        if state['remaining'] is not None:
+            github_rate_limit_remaining.set(state['remaining'], token=token)
+
+registry.add_callback(update_rate_limit_metrics)
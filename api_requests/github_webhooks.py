@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import uuid
+from datetime import UTC, datetime
+
+# Webhook event names that appear in the GitHub events API, and the type they have there
+WEBHOOK_EVENT_TYPES = {
+    'commit_comment': 'CommitCommentEvent',
+    'create': 'CreateEvent',
+    'delete': 'DeleteEvent',
+    'fork': 'ForkEvent',
+    'gollum': 'GollumEvent',
+    'issue_comment': 'IssueCommentEvent',
+    'issues': 'IssuesEvent',
+    'member': 'MemberEvent',
+    'public': 'PublicEvent',
+    'pull_request': 'PullRequestEvent',
+    'pull_request_review': 'PullRequestReviewEvent',
+    'pull_request_review_comment': 'PullRequestReviewCommentEvent',
+    'pull_request_review_thread': 'PullRequestReviewThreadEvent',
+    'push': 'PushEvent',
+    'release': 'ReleaseEvent',
+    'sponsorship': 'SponsorshipEvent',
+    'watch': 'WatchEvent',
+}
+
+def verify_signature(body: bytes, signature: str | None, secret: str) -> bool:
+    """
+    Checks the `X-Hub-Signature-256` header of a GitHub webhook delivery, the HMAC-SHA256
+    of the request body keyed with the webhook secret.
+
+    Args:
+        body (bytes): The raw request body.
+        signature (str | None): The value of the `X-Hub-Signature-256` header.
+        secret (str): The webhook secret.
+
+    Returns:
+        bool: True if the signature matches.
+    """
+    if not signature:
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def convert_delivery_to_event(event_name: str, delivery_id: str, received_at: datetime | None = None) -> dict | None:
+    """
+    Converts a GitHub webhook delivery to an event in the shape of the GitHub events API.
+
+    Webhook payloads don't carry the ID of the event in the events API, so the event ID
+    is derived from the delivery GUID (`X-GitHub-Delivery`). Redelivering the same
+    delivery gives the same ID, so it is saved only once.
+
+    Args:
+        event_name (str): The value of the `X-GitHub-Event` header.
+        delivery_id (str): The value of the `X-GitHub-Delivery` header.
+        received_at (datetime | None): The time the delivery was received, now by default.
+
+    Returns:
+        dict | None: The event, or None if the webhook event has no events API counterpart.
+
+    Raises:
+        ValueError: If the delivery ID is not a GUID.
+    """
+    event_type = WEBHOOK_EVENT_TYPES.get(event_name)
+    if event_type is None:
+        return None
+    received_at = received_at or datetime.now(UTC)
+    return {
+        "id": str(uuid.UUID(delivery_id).int >> 65),
+        "type": event_type,
+        "created_at": received_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
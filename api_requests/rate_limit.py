@@ -0,0 +1,206 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# GitHub asks to wait at least a minute after a secondary rate limit without `Retry-After`
+SECONDARY_RATE_LIMIT_WAIT = 60
+
+
+def is_rate_limit_response(status_code: int, headers, body: str = '') -> bool:
+    """
+    Returns True if GitHub refused a request because of the primary or a secondary rate limit.
+
+    Secondary rate limits are answered with HTTP status 403 (or 429) while requests may
+    still be left, and are told apart from other 403 responses by their message.
+
+    Args:
+        status_code (int): The HTTP status code of the response.
+        headers: The headers of the response.
+        body (str): The body of the response.
+    """
+    if status_code == 429:
+        return True
+    if status_code != 403:
+        return False
+    message = body.lower()
+    return (
+        headers.get('Retry-After', '').isdigit()
+        or headers.get('X-RateLimit-Remaining') == '0'
+        or 'secondary rate limit' in message
+        or 'abuse detection' in message
+    )
+
+
+class RateLimitGovernor:
+    """
+    Tracks the GitHub rate limit of one access token from the response headers.
+
+    Every response updates the remaining requests (`X-RateLimit-Remaining`) and the
+    time the limit resets (`X-RateLimit-Reset`). When GitHub refuses a request because
+    of the primary or a secondary rate limit (HTTP status 403 or 429 with `Retry-After`
+    or no remaining requests), requests are blocked until the given time instead of
+    being retried in place, for at least `SECONDARY_RATE_LIMIT_WAIT` seconds when GitHub
+    does not say how long.
+    """
+
+    def __init__(self):
+        self.remaining = None
+        self.limit = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, status_code: int, headers, body: str = '') -> None:
+        """
+        Updates the rate limit state from a GitHub response.
+
+        Args:
+            status_code (int): The HTTP status code of the response.
+            headers: The headers of the response.
+            body (str): The body of the response, needed for the 403 ones.
+        """
+        now = time.time()
+        with self._lock:
+            if headers.get('X-RateLimit-Remaining', '').isdigit():
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            if headers.get('X-RateLimit-Limit', '').isdigit():
+                self.limit = int(headers['X-RateLimit-Limit'])
+            if headers.get('X-RateLimit-Reset', '').isdigit():
+                self.reset_at = float(headers['X-RateLimit-Reset'])
+
+            if not is_rate_limit_response(status_code, headers, body):
+                return
+            if headers.get('Retry-After', '').isdigit():
+                self.blocked_until = max(self.blocked_until, now + int(headers['Retry-After']))
+            elif self.remaining == 0 and self.reset_at:
+                self.blocked_until = max(self.blocked_until, self.reset_at)
+            else:
+                self.blocked_until = max(self.blocked_until, now + SECONDARY_RATE_LIMIT_WAIT)
+            logger.warning(f'GitHub rate limit reached, requests are paused for {self.blocked_until - now:.0f} seconds')
+
+    def is_blocked(self) -> bool:
+        """
+        Returns True if requests must not be made now, because the rate limit was
+        exceeded or no requests are left until it resets.
+        """
+        now = time.time()
+        with self._lock:
+            exhausted = self.remaining == 0 and self.reset_at is not None and now < self.reset_at
+            return exhausted or now < self.blocked_until
+
+    def get_headroom(self) -> float:
+        """
+        Returns how many requests are known to be left, infinity if it is not known yet.
+        """
+        with self._lock:
+            if self.remaining is None or (self.reset_at is not None and time.time() >= self.reset_at):
+                return math.inf
+            return self.remaining
+
+    def reserve(self) -> None:
+        """
+        Counts a request that is about to be made, until its response updates the state.
+        """
+        with self._lock:
+            if self.remaining:
+                self.remaining -= 1
+
+    def get_budget(self, period: float) -> int | None:
+        """
+        Returns how many requests can be made in the next `period` seconds so that the
+        remaining requests are spread evenly until the rate limit resets.
+
+        Args:
+            period (float): The length of the period in seconds.
+
+        Returns:
+            int | None: The number of requests, or None if the rate limit is not known yet.
+        """
+        now = time.time()
+        with self._lock:
+            if now < self.blocked_until:
+                return 0
+            if self.remaining is None or self.reset_at is None or now >= self.reset_at:
+                return None
+            return math.ceil(self.remaining * min(period / max(self.reset_at - now, 1), 1))
+
+    def get_state(self) -> dict:
+        """
+        Returns the current rate limit state.
+
+        Returns:
+            dict: A dict with the `remaining` and `limit` requests, the `reset_at` and
+                  `blocked_until` Unix timestamps.
+        """
+        with self._lock:
+            return {
+                "remaining": self.remaining,
+                "limit": self.limit,
+                "reset_at": self.reset_at,
+                "blocked_until": self.blocked_until,
+            }
+
+
+class TokenPool:
+    """
+    Spreads GitHub requests over several access tokens, each with its own rate limit.
+
+    Every request uses the token with the most requests left, and tokens that hit
+    their rate limit are skipped until it resets. The pool has the same interface as
+    `RateLimitGovernor` for the whole set of tokens.
+
+    Args:
+        tokens (list): The access tokens, requests are anonymous if it is empty.
+    """
+
+    def __init__(self, tokens: list):
+        self.governors = {token: RateLimitGovernor() for token in tokens or [None]}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> tuple:
+        """
+        Chooses the token for the next request.
+
+        Returns:
+            tuple: A tuple containing:
+                - The access token (str), or None for anonymous requests.
+                - The `RateLimitGovernor` of the token, to update with the response.
+        """
+        with self._lock:
+            available = [item for item in self.governors.items() if not item[1].is_blocked()]
+            token, governor = max(available or self.governors.items(), key=lambda item: item[1].get_headroom())
+            governor.reserve()
+            return token, governor
+
+    def is_blocked(self) -> bool:
+        """
+        Returns True if requests must not be made now with any of the tokens.
+        """
+        return all(governor.is_blocked() for governor in self.governors.values())
+
+    def get_budget(self, period: float) -> int | None:
+        """
+        Returns how many requests can be made with all the tokens in the next `period`
+        seconds, see `RateLimitGovernor.get_budget`.
+        """
+        budgets = [governor.get_budget(period) for governor in self.governors.values()]
+        if None in budgets:
+            return None
+        return sum(budgets)
+
+    def get_state(self) -> dict:
+        """
+        Returns the rate limit state of every token, identified by its position in the
+        pool so that no part of the token is exposed.
+
+        Returns:
+            dict: A dict where keys are token identifiers such as 'token-0', and values
+                  are the states, see `RateLimitGovernor.get_state`.
+        """
+        return {
+            f'token-{index}' if token else 'anonymous': governor.get_state()
+            for index, (token, governor) in enumerate(self.governors.items())
+        }
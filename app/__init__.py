@@ -1,4 +1,3 @@
-import logging
 import os
 
 from flask import Flask
@@ -7,34 +6,74 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
 
+from api_requests.github_requests import github_client
 from app.endpoints import endpoints
-from database import db
-
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
+from app.log_config import configure_logging
+from app.passwords import password_hasher
+from cache.stats_cache import stats_cache
+from cache.user_cache import user_cache
+from database import db, enable_sqlite_wal, get_engine_options
+from database.migrations import upgrade_schema
 
 jwt = JWTManager()
 limiter = Limiter(key_func=get_remote_address, default_limits=["200 per day", "15 per hour"])
 
-def create_app():
+def create_app(config: dict | None = None):
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+    app.config['LOG_LEVEL'] = os.getenv("LOG_LEVEL", "INFO")
+    app.config['LOG_FILE'] = os.getenv("LOG_FILE", "app.log")
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///users.db').replace('postgres://', 'postgresql://', 1)
+    app.config['DATABASE_POOL_SIZE'] = int(os.getenv("DATABASE_POOL_SIZE", 10))
+    app.config['DATABASE_MAX_OVERFLOW'] = int(os.getenv("DATABASE_MAX_OVERFLOW", 20))
+    app.config['DATABASE_POOL_PRE_PING'] = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+    app.config['DATABASE_POOL_RECYCLE'] = int(os.getenv("DATABASE_POOL_RECYCLE", 1800))
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY")
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    app.config['GITHUB_API_URL'] = os.getenv("GITHUB_API_URL", 'https://api.github.com')
+    app.config['GITHUB_TIMEOUT'] = float(os.getenv("GITHUB_TIMEOUT", 10))
+    app.config['GITHUB_REPO_CACHE_TTL'] = int(os.getenv("GITHUB_REPO_CACHE_TTL", 3600))
+    app.config['SYNC_MAX_WORKERS'] = int(os.getenv("SYNC_MAX_WORKERS", 10))
+    app.config['SYNC_MIN_INTERVAL'] = int(os.getenv("SYNC_MIN_INTERVAL", 60))
+    app.config['SYNC_MAX_INTERVAL'] = int(os.getenv("SYNC_MAX_INTERVAL", 6 * 60 * 60))
+    app.config['SYNC_EVENTS_PER_POLL'] = int(os.getenv("SYNC_EVENTS_PER_POLL", 10))
+    app.config['SYNC_PASS_INTERVAL'] = int(os.getenv("SYNC_PASS_INTERVAL", 60))
+    app.config['SYNC_LOCK_TTL'] = int(os.getenv("SYNC_LOCK_TTL", 600))
+    app.config['GITHUB_WEBHOOK_SECRET'] = os.getenv("GITHUB_WEBHOOK_SECRET")
+    app.config['WEBHOOK_INGEST_INTERVAL'] = int(os.getenv("WEBHOOK_INGEST_INTERVAL", 5))
+    app.config['WEBHOOK_STALE_AFTER'] = int(os.getenv("WEBHOOK_STALE_AFTER", 24 * 60 * 60))
+    app.config['RETENTION_POLICY'] = os.getenv("RETENTION_POLICY", "count")
+    app.config['RETENTION_LIMIT'] = int(os.getenv("RETENTION_LIMIT", 500))
+    app.config['STATS_CACHE_SIZE'] = int(os.getenv("STATS_CACHE_SIZE", 10000))
+    app.config['STATS_CACHE_TTL'] = int(os.getenv("STATS_CACHE_TTL", 300))
+    app.config['STATS_CACHE_REDIS_URL'] = os.getenv("STATS_CACHE_REDIS_URL")
+    app.config['USER_REPO_QUOTA'] = int(os.getenv("USER_REPO_QUOTA", 500))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv("USER_CACHE_SIZE", 10000))
+    app.config['USER_CACHE_TTL'] = int(os.getenv("USER_CACHE_TTL", 30))
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', get_engine_options(app.config))
+    # The hashing pool is forked first, while the process has no other threads
+    password_hasher.init_app(app)
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FILE'] or None)
 
     db.init_app(app)
     jwt.init_app(app)
     limiter.init_app(app)
+    stats_cache.init_app(app)
+    user_cache.init_app(app)
+    github_client.init_app(app)
 
     app.register_blueprint(endpoints)
+    # GitHub deliveries are authenticated by their signature and come from a few shared addresses
+    limiter.exempt(app.view_functions['endpoints.receive_github_webhook'])
+    limiter.exempt(app.view_functions['endpoints.get_metrics'])
 
     with app.app_context():
+        enable_sqlite_wal(db.engine, app.config['SQLITE_BUSY_TIMEOUT'])
         db.create_all()
+        upgrade_schema()
 
     return app
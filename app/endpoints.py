@@ -1,15 +1,27 @@
+import hashlib
+import json
 import logging
+import time
+from datetime import UTC, datetime, timedelta
 from typing import Tuple, Dict, Any
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
-from werkzeug.security import check_password_hash, generate_password_hash
-from api_requests.github_requests import check_repo_existance
-from calculations.calculations import calculate_events_statistics
+from flask import Blueprint, Response, current_app, g, jsonify, request, stream_with_context
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from api_requests.github_requests import check_repo_existance, check_repos_existance
+from api_requests.github_webhooks import convert_delivery_to_event, verify_signature
+from app.passwords import password_hasher
+from cache.stats_cache import stats_cache
+from cache.user_cache import user_cache
 from database import functions as db_functions
 from database.models import RepoModel, UserModel
+from metrics.metrics import CONTENT_TYPE, http_request_duration, registry
 
 endpoints = Blueprint('endpoints', __name__)
 
+MAX_BULK_REPOSITORIES = 100
+STATS_PAGE_SIZE = 100
+MAX_STATS_PAGE_SIZE = 500
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -26,6 +38,206 @@ def check_data_required_fields(data: Dict[str, Any], *args: str):
         return False, "Missing required fields: " + ', '.join(missed_fields)
     return True, ""
 
+def get_current_user() -> dict | None:
+    """
+    Returns the user of the current request from the user cache, loading it on a miss.
+
+    The user is looked up by the `user_id` claim of the access token, or by its identity
+    for tokens issued before the claim was added.
+
+    Returns:
+        dict | None: The user, see `get_user`, or None if it does not exist.
+    """
+    username = get_jwt_identity()
+    user_id = get_jwt().get('user_id')
+    current_user = user_cache.get(user_id) if user_id is not None else None
+    if current_user is None:
+        if user_id is not None:
+            current_user = db_functions.get_user(user_id=user_id)
+        else:
+            current_user = db_functions.get_user(username=username)
+        # Only a fresh entry is cached, so that entries expire even if the user keeps polling
+        if current_user is not None:
+            user_cache.set(current_user)
+    if current_user is None or current_user['username'] != username:
+        return None
+    return current_user
+
+def get_repository_names(data: Dict[str, Any]) -> Tuple[list | None, str]:
+    """
+    Extracts the repository names from the body of a bulk request, a `repositories`
+    list of objects with the `owner` and `name` fields.
+
+    Args:
+        data (Dict[str, Any]): The request data.
+
+    Returns:
+        Tuple[list | None, str]: The distinct names in the format 'owner/repo', in the
+            order of the request, or None, and an error message.
+    """
+    fields_check, error_message = check_data_required_fields(data, 'repositories')
+    if not fields_check:
+        return None, error_message
+
+    repositories = data['repositories']
+    if not isinstance(repositories, list) or not repositories:
+        return None, "repositories must be a non-empty list"
+    if len(repositories) > MAX_BULK_REPOSITORIES:
+        return None, f"You cannot send more than {MAX_BULK_REPOSITORIES} repositories at once"
+
+    repo_names = []
+    for repository in repositories:
+        if not isinstance(repository, dict):
+            return None, "Every repository must have an owner and a name"
+        fields_check, error_message = check_data_required_fields(repository, 'owner', 'name')
+        if not fields_check:
+            return None, error_message
+        repo_names.append(f"{repository['owner']}/{repository['name']}")
+    return list(dict.fromkeys(repo_names)), ""
+
+def parse_stats_window(args) -> Tuple[Dict[str, Any] | None, str]:
+    """
+    Parses the `since`, `until` and `bucket` query parameters of the statistics endpoints.
+
+    `until` defaults to now and `since` to a week before `until`. Timestamps are in
+    ISO 8601, in UTC unless they have an offset.
+
+    Args:
+        args: The query parameters of the request.
+
+    Returns:
+        Tuple[Dict[str, Any] | None, str]: The window with the `since`, `until` and `bucket`
+            keys, or None if none of the parameters are given, and an error message.
+    """
+    if not any(name in args for name in ('since', 'until', 'bucket')):
+        return None, ""
+
+    try:
+        timestamps = {}
+        for name in ('since', 'until'):
+            if name in args:
+                timestamp = datetime.fromisoformat(args[name])
+                if timestamp.tzinfo is not None:
+                    timestamp = timestamp.astimezone(UTC).replace(tzinfo=None)
+                timestamps[name] = timestamp
+    except ValueError:
+        return None, "since and until must be ISO 8601 timestamps"
+
+    until = timestamps.get('until', datetime.now(UTC).replace(tzinfo=None, microsecond=0))
+    since = timestamps.get('since', until - timedelta(days=db_functions.STATS_WINDOW_DAYS))
+    if since >= until:
+        return None, "since must be before until"
+
+    bucket = args.get('bucket')
+    if bucket is not None and bucket not in db_functions.STATS_BUCKET_FORMATS:
+        return None, "bucket must be one of: " + ', '.join(db_functions.STATS_BUCKET_FORMATS)
+    return {"since": since, "until": until, "bucket": bucket}, ""
+
+def get_window_statistics(repos: list, window: Dict[str, Any]) -> dict:
+    """
+    Returns the statistics of the given repositories over a window, see `parse_stats_window`.
+
+    Args:
+        repos (list): The synchronized repositories (RepoModel).
+        window (Dict[str, Any]): The window.
+
+    Returns:
+        dict: A dictionary where keys are repository IDs, and values are the `statistics`
+              and, if the window has a bucket, the `buckets` of the repository response.
+    """
+    repo_ids = [repo.id for repo in repos]
+    statistics = db_functions.get_events_window_statistics(repo_ids, window['since'], window['until'])
+    if window['bucket']:
+        histograms = db_functions.get_events_histogram(repo_ids, window['since'], window['until'], window['bucket'])
+
+    result = {}
+    for repo_id in repo_ids:
+        result[repo_id] = {"statistics": statistics[repo_id] or None}
+        if window['bucket']:
+            result[repo_id]["buckets"] = histograms[repo_id]
+    return result
+
+def format_stats_window(window: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Formats a window, see `parse_stats_window`, for a response.
+    """
+    return {
+        "since": window['since'].isoformat() + 'Z',
+        "until": window['until'].isoformat() + 'Z',
+        "bucket": window['bucket'],
+    }
+
+def get_cached_events_statistics(repos: list) -> dict:
+    """
+    Returns the statistics of the given repositories, computing only the ones
+    that are not in the statistics cache.
+
+    Args:
+        repos (list): The synchronized repositories (RepoModel).
+
+    Returns:
+        dict: A dictionary where keys are repository IDs, and values are the statistics.
+    """
+    statistics = {}
+    missed_repos = []
+    for repo in repos:
+        cached_statistics = stats_cache.get(repo)
+        if cached_statistics is None:
+            missed_repos.append(repo)
+        else:
+            statistics[repo.id] = cached_statistics
+
+    if missed_repos:
+        computed_statistics = db_functions.get_events_statistics(missed_repos)
+        for repo in missed_repos:
+            stats_cache.set(repo, computed_statistics[repo.id])
+        statistics.update(computed_statistics)
+    return statistics
+
+def make_stats_response(result: Dict[str, Any], repos: list) -> Response:
+    """
+    Builds a statistics response with an ETag derived from the synchronization state
+    of the repositories, the window of the statistics and the next page cursor, answering 304 Not Modified
+    if the client already has it.
+
+    Args:
+        result (Dict[str, Any]): The response data.
+        repos (list): The repositories in the response (RepoModel).
+    """
+    state = '|'.join(f'{repo.name}:{repo.last_synced}:{repo.stats_updated_at}' for repo in repos)
+    # The window and the next page cursor are part of the response as well
+    extra = {key: value for key, value in result.items() if key != "repositories"}
+    state += '|' + json.dumps(extra, sort_keys=True)
+    response = jsonify(result)
+    response.set_etag(hashlib.sha1(state.encode()).hexdigest())
+    return response.make_conditional(request)
+
+@endpoints.before_app_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+@endpoints.after_app_request
+def record_request_duration(response: Response) -> Response:
+    """
+    Records the duration of every request of the application by endpoint, method and status.
+    """
+    if 'request_started_at' in g:
+        http_request_duration.observe(
+            time.perf_counter() - g.request_started_at,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+@endpoints.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Exposes the metrics of the process in the Prometheus text format. The endpoint is
+    not authenticated, so it should only be reachable by the metrics scraper.
+    """
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
 @endpoints.route('/auth/register', methods=['POST'])
 def register():
     """
@@ -42,17 +254,20 @@ def register():
     if UserModel.query.filter_by(username=username).first():
         return jsonify({"message": "Username is already taken"}), 400
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = password_hasher.hash(password)
     new_user = UserModel(username=username, password=hashed_password)
     new_user.save_to_db()
 
-    access_token = create_access_token(identity=username, expires_delta=False)
+    access_token = create_access_token(
+        identity=username, additional_claims={"user_id": new_user.id}, expires_delta=False
+    )
     return jsonify(access_token=access_token), 200
 
 @endpoints.route('/auth/login', methods=['POST'])
 def login():
     """
     Logs in an existing user by verifying their password and generates an access token.
+    Passwords hashed with other parameters than the configured ones are hashed again.
     """
     data = request.get_json()
     fields_check, error_message = check_data_required_fields(data, 'username', 'password')
@@ -63,10 +278,14 @@ def login():
     password = data['password']
 
     user = UserModel.query.filter_by(username=username).first()
-    if not user or not check_password_hash(user.password, password):
+    if not user or not password_hasher.verify(user.password, password):
         return jsonify({"message": "Invalid username or password"}), 400
 
-    access_token = create_access_token(identity=username)
+    if password_hasher.needs_rehash(user.password):
+        user.password = password_hasher.hash(password)
+        user.save_to_db()
+
+    access_token = create_access_token(identity=username, additional_claims={"user_id": user.id})
     return jsonify(access_token=access_token), 200
 
 @endpoints.route('/repository', methods=['POST'])
@@ -75,8 +294,7 @@ def add_repository():
     """
     Adds a new repository to the user's list after verifying its existence on GitHub.
     """
-    username = get_jwt_identity()
-    current_user = UserModel.query.filter_by(username=username).first()
+    current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "User not found"}), 404
 
@@ -95,7 +313,7 @@ def add_repository():
         else:
             return jsonify({"message": "We cannot get access to this repository"}), 400
 
-    result, message = db_functions.add_user_repo_link(user_id=current_user.id, repo_id=repo.id)
+    result, message = db_functions.add_user_repo_link(user_id=current_user['id'], repo_id=repo.id)
     status_code = 200 if result else 400
     return jsonify({"message": message}), status_code
 
@@ -105,8 +323,7 @@ def delete_repository():
     """
     Deletes a repository from the user's list.
     """
-    username = get_jwt_identity()
-    current_user = UserModel.query.filter_by(username=username).first()
+    current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "User not found"}), 404
 
@@ -121,18 +338,76 @@ def delete_repository():
     if repo is None:
         return jsonify({"message": f"Repository {repo_name} doesn't exist"}), 400
 
-    result, message = db_functions.delete_user_repo_link(user_id=current_user.id, repo_id=repo.id)
+    result, message = db_functions.delete_user_repo_link(user_id=current_user['id'], repo_id=repo.id)
     status_code = 200 if result else 400
     return jsonify({"message": message}), status_code
 
+@endpoints.route('/repository/bulk', methods=['POST'])
+@jwt_required()
+def add_repositories():
+    """
+    Adds many repositories to the user's list at once, verifying the existence of the
+    ones that are not tracked yet on GitHub concurrently.
+    """
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({"message": "User not found"}), 404
+
+    repo_names, error_message = get_repository_names(request.get_json())
+    if repo_names is None:
+        return jsonify({"message": error_message}), 400
+
+    tracked_repo_names = {
+        repo.name for repo in RepoModel.query.with_entities(RepoModel.name).filter(RepoModel.name.in_(repo_names))
+    }
+    existance = check_repos_existance(
+        [repo_name for repo_name in repo_names if repo_name not in tracked_repo_names],
+        max_workers=current_app.config['SYNC_MAX_WORKERS'],
+    )
+
+    results = {}
+    for repo_name, exists in existance.items():
+        if exists is None:
+            results[repo_name] = (False, "We cannot check this repository now, please try again later")
+        elif not exists:
+            results[repo_name] = (False, "We cannot get access to this repository")
+    results.update(db_functions.add_user_repo_links(
+        user_id=current_user['id'],
+        repo_names=[repo_name for repo_name in repo_names if repo_name not in results],
+    ))
+
+    return jsonify({"repositories": [
+        {"repository": repo_name, "success": results[repo_name][0], "message": results[repo_name][1]}
+        for repo_name in repo_names
+    ]}), 200
+
+@endpoints.route('/repository/bulk', methods=['DELETE'])
+@jwt_required()
+def delete_repositories():
+    """
+    Deletes many repositories from the user's list at once.
+    """
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({"message": "User not found"}), 404
+
+    repo_names, error_message = get_repository_names(request.get_json())
+    if repo_names is None:
+        return jsonify({"message": error_message}), 400
+
+    results = db_functions.delete_user_repo_links(user_id=current_user['id'], repo_names=repo_names)
+    return jsonify({"repositories": [
+        {"repository": repo_name, "success": results[repo_name][0], "message": results[repo_name][1]}
+        for repo_name in repo_names
+    ]}), 200
+
 @endpoints.route('/repository/stats', methods=['GET'])
 @jwt_required()
 def get_repository_stats():
     """
     Retrieves statistics for a repository in the user's list.
     """
-    username = get_jwt_identity()
-    current_user = UserModel.query.filter_by(username=username).first()
+    current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "User not found"}), 404
 
@@ -144,41 +419,78 @@ def get_repository_stats():
     repo_name = f"{data['owner']}/{data['name']}"
     repo = RepoModel.query.filter_by(name=repo_name).first()
 
-    if repo is None or not db_functions.check_user_repo_link(current_user.id, repo.id):
+    if repo is None or repo.id not in current_user['repo_ids']:
         return jsonify({"message": "You don't have this repository in your list"}), 400
 
     if repo.last_synced is None:
         return jsonify({"message": "We don't have any data for this repository yet"}), 400
 
+    window, error_message = parse_stats_window(request.args)
+    if error_message:
+        return jsonify({"message": error_message}), 400
+
     result = {"repositories" : []}
-    statistics = calculate_events_statistics(repo.name)
+    if window is None:
+        statistics = get_cached_events_statistics([repo])[repo.id]
+        repo_result = {"statistics": statistics if statistics != {} else None}
+    else:
+        result["window"] = format_stats_window(window)
+        repo_result = get_window_statistics([repo], window)[repo.id]
     result["repositories"].append(
         {
             "repository": repo_name,
-            "statistics": statistics if statistics != {} else None,
+            **repo_result,
             "last_synchronized": str(repo.last_synced),
         }
     )
-    return jsonify(result), 200
+    return make_stats_response(result, [repo])
 
-@endpoints.route('/repository/all/stats', methods=['GET'])
-@jwt_required()
-def get_all_repositories_stats():
+def parse_stats_page(args: Dict[str, Any]) -> Tuple[Tuple[int, int] | None, str]:
     """
-    Retrieves statistics for all of the repositories in the user's list.
+    Parses the `limit` and `cursor` query parameters of a paginated statistics request.
+    The cursor is the `next_cursor` of the previous page, the ID of its last repository.
+
+    Args:
+        args (Dict[str, Any]): The query parameters of the request.
+
+    Returns:
+        Tuple[Tuple[int, int] | None, str]: The page size and the cursor (0 for the first
+                                            page), or None and an error message.
     """
-    username = get_jwt_identity()
-    current_user = UserModel.query.filter_by(username=username).first()
-    if not current_user:
-        return jsonify({"message": "User not found"}), 404
+    try:
+        limit = int(args.get('limit', STATS_PAGE_SIZE))
+        cursor = int(args.get('cursor', 0))
+    except ValueError:
+        return None, "Parameters limit and cursor must be integers"
+    if not 1 <= limit <= MAX_STATS_PAGE_SIZE:
+        return None, f"Parameter limit must be between 1 and {MAX_STATS_PAGE_SIZE}"
+    if cursor < 0:
+        return None, "Invalid cursor"
+    return (limit, cursor), ""
+
+def get_repositories_results(repos: list, window: Dict[str, Any] | None) -> list:
+    """
+    Returns the statistics entries of the given repositories for a response, with
+    a null entry for the repositories that were never synchronized.
 
-    if current_user.repos is None:
-        return jsonify({"message": "You don't have any repositories in your list"}), 400
+    Args:
+        repos (list): The repositories (RepoModel).
+        window (Dict[str, Any] | None): The window of the statistics, see `parse_stats_window`,
+                                        or None for the precomputed statistics.
+    """
+    synced_repos = [repo for repo in repos if repo.last_synced is not None]
+    if window is None:
+        repos_results = {
+            repo_id: {"statistics": statistics if statistics != {} else None}
+            for repo_id, statistics in get_cached_events_statistics(synced_repos).items()
+        }
+    else:
+        repos_results = get_window_statistics(synced_repos, window)
 
-    result = {"repositories" : []}
-    for repo in current_user.repos:
+    results = []
+    for repo in repos:
         if repo.last_synced is None:
-            result["repositories"].append(
+            results.append(
                 {
                     "repository": repo.name,
                     "statistics": None,
@@ -186,13 +498,88 @@ def get_all_repositories_stats():
                 }
             )
         else:
-            statistics = calculate_events_statistics(repo.name)
-            result["repositories"].append(
+            results.append(
                 {
                     "repository": repo.name,
-                    "statistics": statistics if statistics != {} else None,
+                    **repos_results[repo.id],
                     "last_synchronized": str(repo.last_synced),
                 }
             )
+    return results
+
+@endpoints.route('/repository/all/stats', methods=['GET'])
+@jwt_required()
+def get_all_repositories_stats():
+    """
+    Retrieves statistics for the repositories in the user's list, a page of `limit`
+    repositories after `cursor` at a time. With `format=ndjson` or an `Accept:
+    application/x-ndjson` header, streams all of them instead, one JSON line per repository.
+    """
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({"message": "User not found"}), 404
+
+    window, error_message = parse_stats_window(request.args)
+    if error_message:
+        return jsonify({"message": error_message}), 400
+    page, error_message = parse_stats_page(request.args)
+    if error_message:
+        return jsonify({"message": error_message}), 400
+    limit, cursor = page
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON_CONTENT_TYPE:
+        def generate_lines():
+            # Reads the repositories a page at a time, so that only one page is in memory
+            after = cursor
+            while True:
+                repos = db_functions.get_user_repos(current_user['id'], after, limit)
+                for entry in get_repositories_results(repos, window):
+                    yield json.dumps(entry) + '\n'
+                if len(repos) < limit:
+                    return
+                after = repos[-1].id
+
+        return Response(stream_with_context(generate_lines()), content_type=NDJSON_CONTENT_TYPE)
+
+    # One more repository than the page tells whether there is a next page
+    user_repos = db_functions.get_user_repos(current_user['id'], cursor, limit + 1)
+    next_cursor = user_repos[limit - 1].id if len(user_repos) > limit else None
+    user_repos = user_repos[:limit]
+
+    result = {"repositories": get_repositories_results(user_repos, window), "next_cursor": next_cursor}
+    if window is not None:
+        result["window"] = format_stats_window(window)
+    return make_stats_response(result, user_repos)
+
+@endpoints.route('/webhooks/github', methods=['POST'])
+def receive_github_webhook():
+    """
+    Receives a GitHub webhook delivery for a tracked repository and queues its event
+    for ingestion by the sync worker.
+    """
+    secret = current_app.config['GITHUB_WEBHOOK_SECRET']
+    if not secret:
+        return jsonify({"message": "Webhooks are not configured"}), 404
+
+    if not verify_signature(request.get_data(), request.headers.get('X-Hub-Signature-256'), secret):
+        return jsonify({"message": "Invalid signature"}), 401
+
+    event_name = request.headers.get('X-GitHub-Event', '')
+    if event_name == 'ping':
+        return jsonify({"message": "pong"}), 200
+
+    data = request.get_json(silent=True) or {}
+    repo_name = data.get('repository', {}).get('full_name')
+    repo = RepoModel.query.filter_by(name=repo_name).first() if repo_name else None
+    if repo is None:
+        return jsonify({"message": "Repository is not tracked"}), 202
+
+    try:
+        event = convert_delivery_to_event(event_name, request.headers.get('X-GitHub-Delivery', ''))
+    except ValueError:
+        return jsonify({"message": "Invalid delivery ID"}), 400
+    if event is None:
+        return jsonify({"message": f"Event {event_name} is not tracked"}), 202
 
-    return jsonify(result), 200
+    db_functions.queue_webhook_event(event, repo.id)
+    return jsonify({"message": "Event queued"}), 202
@@ -0,0 +1,38 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+def configure_logging(level: str = 'INFO', filename: str | None = 'app.log') -> None:
+    """
+    Configures the root logger to hand records over to a queue, written to the console
+    and to `filename` by a background thread, so logging never blocks on I/O.
+
+    Only the first call configures the handlers, later ones only change the level.
+
+    Args:
+        level (str): The minimum level of the logged records, for example 'DEBUG' or 'WARNING'.
+        filename (str | None): The log file, or None to only log to the console.
+    """
+    global _listener
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level.upper())
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if filename:
+        handlers.append(logging.FileHandler(filename))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
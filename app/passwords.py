@@ -0,0 +1,69 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with the werkzeug method in `PASSWORD_HASH_METHOD`,
+    for example 'scrypt:32768:8:1' or 'pbkdf2:sha256:1000000'.
+
+    Hashing is CPU-bound and holds the GIL, so it runs on a pool of
+    `PASSWORD_HASH_WORKERS` processes while the request thread waits without blocking
+    the others. The processes are started with the application, before any request
+    thread, so they are forked from a single-threaded process. With 0 workers hashing
+    runs in the request thread.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 0
+        self.prefix = None
+        self._executor = None
+
+    def init_app(self, app) -> None:
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        # The prefix of the hashes, with the default parameters of the method filled in
+        self.prefix = generate_password_hash('', method=self.method).split('$', 1)[0]
+        self.shutdown()
+        if self.workers > 0:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(start_method)
+            )
+            # The first task starts all the processes
+            self._executor.submit(int).result()
+
+    def _run(self, function, *args):
+        if self._executor is None:
+            return function(*args)
+        return self._executor.submit(function, *args).result()
+
+    def hash(self, password: str) -> str:
+        """
+        Returns the hash of a password.
+        """
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """
+        Returns True if a password matches a hash, whatever method the hash was made with.
+        """
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Returns True if a hash was made with another method or other parameters than
+        the configured ones.
+        """
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,84 @@
+"""
+Compares the rows per second of bulk event ingestion against saving events one by one on SQLite.
+
+Usage:
+    python -m benchmarks.bench_ingestion --repos 20 --events 100
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.fake_github import generate_events
+
+
+def save_events_one_by_one(events: list, repo) -> None:
+    """
+    The per-event ingestion path used before bulk ingestion: a lookup, an insert
+    and a commit for every event.
+    """
+    from database import db
+    from database.models import EventModel
+
+    for event in events:
+        if not EventModel.query.filter_by(id=event['id']).first():
+            db.session.add(EventModel(
+                id=event['id'],
+                type=event['type'],
+                created_at=datetime.strptime(event['created_at'], "%Y-%m-%dT%H:%M:%SZ"),
+                repository=repo
+            ))
+            db.session.commit()
+
+
+def save_events_in_bulk(events: list, repo) -> None:
+    from database import db
+    from database.functions import save_new_events
+
+    save_new_events(events, repo.id)
+    db.session.commit()
+
+
+def run_ingestion(save, repos: int, events: int) -> float:
+    """
+    Saves `events` events for each of `repos` repositories twice, so that half of the
+    rows are duplicates, and returns the rows processed per second.
+    """
+    from app import create_app
+    from database import db
+    from database.models import RepoModel
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}'})
+        with app.app_context():
+            repo_models = [RepoModel(name=f'bench/repo-{i}') for i in range(repos)]
+            db.session.add_all(repo_models)
+            db.session.commit()
+            pages = [(repo, generate_events(repo.name, events)) for repo in repo_models]
+
+            start = time.perf_counter()
+            for _ in range(2):
+                for repo, page in pages:
+                    save(page, repo)
+            elapsed = time.perf_counter() - start
+
+            db.engine.dispose()
+    return 2 * repos * events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repos', type=int, default=20)
+    parser.add_argument('--events', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    for name, save in (('one by one', save_events_one_by_one), ('bulk', save_events_in_bulk)):
+        throughput = run_ingestion(save, args.repos, args.events)
+        print(f'{name:<12} {throughput:12.1f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures the latency of `/auth/login` while the statistics endpoints are polled at the
+same time, with password hashing in the request threads or on a process pool.
+
+Both run over HTTP against the API served by a threaded werkzeug server.
+
+Usage:
+    python -m benchmarks.bench_login --hash-workers 0 2 --duration 10
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import UTC, datetime
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.fake_github import generate_events
+
+REPOS_PER_USER = 5
+
+
+def percentile(latencies: list, p: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] * 1000
+
+
+def hammer(url: str, request_kwargs: dict, deadline: float, latencies: list, method: str = 'get') -> None:
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = session.request(method, url, **request_kwargs)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+def run_load(hash_workers: int, users: int, login_clients: int, stats_clients: int, duration: float) -> dict:
+    """
+    Serves a fresh API and runs the login and statistics clients against it for `duration` seconds.
+    """
+    from app import create_app
+    from database import db
+    from database.functions import add_user_repo_links, save_new_events
+    from database.models import RepoModel
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}',
+            'JWT_SECRET_KEY': 'bench-secret-key-of-at-least-32-bytes',
+            'RATELIMIT_ENABLED': False,
+            'PASSWORD_HASH_WORKERS': hash_workers,
+        })
+        client = app.test_client()
+        tokens = []
+        for i in range(users):
+            response = client.post('/auth/register', json={'username': f'user-{i}', 'password': f'password-{i}'})
+            tokens.append(response.get_json()['access_token'])
+        with app.app_context():
+            now = datetime.now(UTC)
+            for i in range(users):
+                repo_names = [f'bench/repo-{i}-{j}' for j in range(REPOS_PER_USER)]
+                add_user_repo_links(i + 1, repo_names)
+                for repo in RepoModel.query.filter(RepoModel.name.in_(repo_names)):
+                    save_new_events(generate_events(repo.name, 200, now), repo.id)
+                    repo.last_synced = now
+                db.session.commit()
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        login_latencies, stats_latencies = [], []
+        deadline = time.perf_counter() + duration
+        threads = [
+            threading.Thread(target=hammer, args=(
+                f'{base_url}/auth/login',
+                {'json': {'username': f'user-{i % users}', 'password': f'password-{i % users}'}},
+                deadline, login_latencies, 'post',
+            ))
+            for i in range(login_clients)
+        ] + [
+            threading.Thread(target=hammer, args=(
+                f'{base_url}/repository/all/stats',
+                {'headers': {'Authorization': f'Bearer {tokens[i % users]}'}},
+                deadline, stats_latencies,
+            ))
+            for i in range(stats_clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        server.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+
+    return {'login': login_latencies, 'stats': stats_latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hash-workers', type=int, nargs='+', default=[0, 2])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--login-clients', type=int, default=4)
+    parser.add_argument('--stats-clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    for hash_workers in args.hash_workers:
+        results = run_load(hash_workers, args.users, args.login_clients, args.stats_clients, args.duration)
+        for name, latencies in results.items():
+            print(f'hash_workers={hash_workers:<3} {name:<6} requests={len(latencies):<6} '
+                  f'p50={statistics.median(latencies) * 1000:8.1f} ms p99={percentile(latencies, 99):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Times the hot database queries as the event table grows and prints their SQLite query plans.
+
+Every repository has the same number of events, so with the indexes in place the time
+of each query should stay roughly flat while the total number of events grows.
+
+Usage:
+    python -m benchmarks.bench_queries --events 10000 100000 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import event, insert
+
+EVENTS_PER_REPO = 500
+
+
+def populate(total_events: int) -> None:
+    from database import db
+    from database.models import EventModel, RepoModel
+
+    now = datetime.now(UTC)
+    repos = max(total_events // EVENTS_PER_REPO, 1)
+    db.session.execute(insert(RepoModel), [
+        {'id': i + 1, 'name': f'bench/repo-{i}', 'next_sync_at': now + timedelta(seconds=random.randint(1, 3600))}
+        for i in range(repos)
+    ])
+    batch = []
+    for event_id in range(1, total_events + 1):
+        batch.append({
+            'id': event_id,
+            'type': random.choice(('PushEvent', 'IssuesEvent', 'WatchEvent')),
+            'created_at': now - timedelta(minutes=random.randint(0, 14 * 24 * 60)),
+            'repository_id': event_id % repos + 1,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(EventModel), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(EventModel), batch)
+    db.session.commit()
+
+
+def hot_queries(repos: int) -> dict:
+    from database import db
+    from database.functions import delete_extra_events, refresh_events_statistics
+    from database.models import RepoModel
+
+    def repo_by_name():
+        RepoModel.query.filter_by(name=f'bench/repo-{random.randrange(repos)}').first()
+
+    def repos_to_sync():
+        RepoModel.query.filter(
+            (RepoModel.next_sync_at == None) | (RepoModel.next_sync_at <= datetime.now(UTC))
+        ).all()
+
+    def retention():
+        delete_extra_events(random.randrange(repos) + 1, 'count', EVENTS_PER_REPO - 50)
+        db.session.rollback()
+
+    def statistics_refresh():
+        refresh_events_statistics([random.randrange(repos) + 1])
+        db.session.rollback()
+
+    return {
+        'repository by name': repo_by_name,
+        'repositories to sync': repos_to_sync,
+        'retention delete': retention,
+        'statistics refresh': statistics_refresh,
+    }
+
+
+def explain(query) -> list:
+    """
+    Runs the query once, recording its statements, and returns their SQLite query plans.
+    """
+    from database import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'DELETE', 'UPDATE')):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        query()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    plans = []
+    with db.engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+            plans.append([row[-1] for row in rows])
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--plans', action='store_true', help='print the query plans')
+    args = parser.parse_args()
+
+    from app import create_app
+    from database import db
+
+    logging.disable(logging.CRITICAL)
+    random.seed(0)
+    for total_events in args.events:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}'})
+            with app.app_context():
+                populate(total_events)
+                repos = max(total_events // EVENTS_PER_REPO, 1)
+                for name, query in hot_queries(repos).items():
+                    query()
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        query()
+                    elapsed_ms = (time.perf_counter() - start) / args.repeat * 1000
+                    print(f'events={total_events:<9} {name:<22} {elapsed_ms:8.3f} ms')
+                    if args.plans:
+                        for plan in explain(query):
+                            print('    ' + '; '.join(plan))
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Measures the throughput of `synchronize_db_events` against a local fake GitHub API.
+
+Usage:
+    python -m benchmarks.bench_sync --repos 200 --latency 0.05 --workers 1 10 50
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.fake_github import FakeGitHub
+
+
+def run_sync(fake: FakeGitHub, repos: int, workers: int) -> float:
+    """
+    Runs one synchronization pass over `repos` fresh repositories and returns repos per second.
+    """
+    from app import create_app
+    from database import db
+    from database.functions import synchronize_db_events
+    from database.models import RepoModel
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}',
+            'SYNC_MAX_WORKERS': workers,
+        })
+        with app.app_context():
+            db.session.add_all(RepoModel(name=f'bench/repo-{i}') for i in range(repos))
+            db.session.commit()
+
+            start = time.perf_counter()
+            synchronize_db_events()
+            elapsed = time.perf_counter() - start
+
+            db.engine.dispose()
+    return repos / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repos', type=int, default=200)
+    parser.add_argument('--events', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 10, 50])
+    args = parser.parse_args()
+
+    with FakeGitHub(events_per_repo=args.events, latency=args.latency) as fake:
+        os.environ['GITHUB_API_URL'] = fake.url
+        logging.disable(logging.CRITICAL)
+        for workers in args.workers:
+            throughput = run_sync(fake, args.repos, workers)
+            print(f'workers={workers:<4} repos={args.repos:<6} {throughput:10.1f} repos/s')
+
+
+if __name__ == '__main__':
+    main()
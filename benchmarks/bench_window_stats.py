@@ -0,0 +1,88 @@
+"""
+Times the window statistics and histogram queries over a synthetic event table.
+
+The events are spread evenly over the last 30 days across the repositories, and the
+queries are timed for windows of growing length over one repository and over many.
+
+Usage:
+    python -m benchmarks.bench_window_stats --events 1000000 --repos 100
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import insert
+
+EVENT_TYPES = ('PushEvent', 'IssuesEvent', 'PullRequestEvent', 'WatchEvent', 'ForkEvent')
+DAYS = 30
+
+
+def populate(total_events: int, repos: int, now: datetime) -> None:
+    from database import db
+    from database.models import EventModel, RepoModel
+
+    db.session.execute(insert(RepoModel), [{'id': i + 1, 'name': f'bench/repo-{i}'} for i in range(repos)])
+    batch = []
+    for event_id in range(1, total_events + 1):
+        batch.append({
+            'id': event_id,
+            'type': random.choice(EVENT_TYPES),
+            'created_at': now - timedelta(seconds=random.randint(0, DAYS * 24 * 60 * 60)),
+            'repository_id': event_id % repos + 1,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(EventModel), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(EventModel), batch)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--repos', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from database import db
+    from database.functions import get_events_histogram, get_events_window_statistics
+
+    logging.disable(logging.CRITICAL)
+    random.seed(0)
+    now = datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}'})
+        with app.app_context():
+            start = time.perf_counter()
+            populate(args.events, args.repos, now)
+            print(f'populated {args.events} events in {args.repos} repositories in {time.perf_counter() - start:.1f} s')
+
+            all_repo_ids = list(range(1, args.repos + 1))
+            for repo_ids in ([1], all_repo_ids[:10], all_repo_ids):
+                for days in (1, 7, DAYS):
+                    since = now - timedelta(days=days)
+                    queries = {
+                        'statistics': lambda: get_events_window_statistics(repo_ids, since, now),
+                        'daily histogram': lambda: get_events_histogram(repo_ids, since, now, 'day'),
+                        'hourly histogram': lambda: get_events_histogram(repo_ids, since, now, 'hour'),
+                    }
+                    window_events = round(args.events * len(repo_ids) / args.repos * days / DAYS)
+                    for name, query in queries.items():
+                        query()
+                        start = time.perf_counter()
+                        for _ in range(args.repeat):
+                            query()
+                        elapsed_ms = (time.perf_counter() - start) / args.repeat * 1000
+                        print(f'repos={len(repo_ids):<5} days={days:<3} events~{window_events:<9} '
+                              f'{name:<17} {elapsed_ms:9.1f} ms')
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+import time
+import zlib
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+EVENT_TYPES = ['PushEvent', 'IssuesEvent', 'PullRequestEvent', 'WatchEvent', 'ForkEvent']
+EVENTS_PATH = re.compile(r'^/repos/(?P<repo>[^/]+/[^/]+)/events$')
+REPO_PATH = re.compile(r'^/repos/(?P<repo>[^/]+/[^/]+)$')
+
+
+def generate_events(repo: str, count: int, newest_at: datetime | None = None) -> list:
+    """
+    Generates deterministic GitHub events for a repository, newest first, one minute apart.
+
+    Event IDs only depend on the repository and the position of the event, counted from
+    the oldest one, so generating more events for the same repository adds new IDs
+    while keeping the old ones.
+
+    Args:
+        repo (str): The full name of the repository in the format 'owner/repo'.
+        count (int): The number of events to generate.
+        newest_at (datetime | None): The time of the newest event, now by default.
+
+    Returns:
+        list: A list of event dictionaries in the shape of the GitHub events API.
+    """
+    seed = zlib.crc32(repo.encode())
+    newest_at = (newest_at or datetime.now(UTC)).replace(microsecond=0)
+    return [
+        {
+            'id': str(seed * 10 ** 6 + count - i),
+            'type': EVENT_TYPES[(seed + count - i) % len(EVENT_TYPES)],
+            'created_at': (newest_at - timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        for i in range(count)
+    ]
+
+
+class FakeGitHub:
+    """
+    A local HTTP server that imitates the parts of the GitHub API used by the tracker.
+
+    Events are served newest first in pages of `per_page` (30 by default, at most 100)
+    with `Link` headers, `ETag` and `X-Poll-Interval` headers, and 304 responses to
+    matching `If-None-Match` requests.
+
+    Args:
+        events_per_repo (int): The number of events every repository starts with.
+        repo_events (dict | None): The number of events specific repositories start with,
+                                   instead of `events_per_repo`.
+        latency (float): The delay in seconds added to every response.
+        rate_limit (int | None): The number of requests allowed per access token (the
+                                 `Authorization` header) in every `rate_limit_window`
+                                 seconds, unlimited if None.
+        rate_limit_window (float): The length of the rate limit window in seconds.
+    """
+
+    def __init__(self, events_per_repo: int = 30, latency: float = 0.05,
+                 rate_limit: int | None = None, rate_limit_window: float = 3600,
+                 repo_events: dict | None = None):
+        self.events_per_repo = events_per_repo
+        self.repo_events = repo_events or {}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.requests_count = 0
+        self.rate_limits = {}
+        self.new_events = {}
+        self.started_at = datetime.now(UTC)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeGitHub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeGitHub':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def add_events(self, repo: str, count: int) -> None:
+        """
+        Adds `count` new events to a repository, one minute apart after the existing ones.
+        """
+        with self._lock:
+            self.new_events[repo] = self.new_events.get(repo, 0) + count
+
+    def get_events(self, repo: str) -> list:
+        """
+        Returns all the events of a repository, newest first.
+        """
+        new_events = self.new_events.get(repo, 0)
+        return generate_events(
+            repo,
+            self.repo_events.get(repo, self.events_per_repo) + new_events,
+            self.started_at + timedelta(minutes=new_events),
+        )
+
+    def _use_rate_limit(self, token: str | None) -> dict:
+        """
+        Counts a request against the rate limit of a token and returns the rate limit
+        headers for the response. The remaining count is -1 if the request is refused.
+        """
+        if self.rate_limit is None:
+            return {}
+        now = time.time()
+        remaining, reset_at = self.rate_limits.get(token, (self.rate_limit, now + self.rate_limit_window))
+        if now >= reset_at:
+            remaining, reset_at = self.rate_limit, now + self.rate_limit_window
+        remaining -= 1
+        self.rate_limits[token] = (max(remaining, 0), reset_at)
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(remaining, -1)),
+            'X-RateLimit-Reset': str(int(reset_at)),
+        }
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests_count += 1
+                    headers = fake._use_rate_limit(self.headers.get('Authorization'))
+                time.sleep(fake.latency)
+
+                url = urlsplit(self.path)
+                if headers.get('X-RateLimit-Remaining') == '-1':
+                    headers['X-RateLimit-Remaining'] = '0'
+                    self._send_json(403, {'message': 'API rate limit exceeded'}, headers)
+                elif match := EVENTS_PATH.match(url.path):
+                    self._send_events(match['repo'], parse_qs(url.query), headers)
+                elif match := REPO_PATH.match(url.path):
+                    self._send_json(200, {'full_name': match['repo']}, headers)
+                else:
+                    self._send_json(404, {'message': 'Not Found'}, headers)
+
+            def _send_events(self, repo: str, query: dict, headers: dict) -> None:
+                per_page = min(int(query.get('per_page', ['30'])[0]), 100)
+                page = int(query.get('page', ['1'])[0])
+                events = fake.get_events(repo)
+
+                etag = f'"{zlib.crc32(repo.encode()):x}-{len(events)}-{page}"'
+                headers.update({'ETag': etag, 'X-Poll-Interval': '60'})
+                if page * per_page < len(events):
+                    next_url = f'{fake.url}/repos/{repo}/events?per_page={per_page}&page={page + 1}'
+                    headers['Link'] = f'<{next_url}>; rel="next"'
+
+                if self.headers.get('If-None-Match') == etag:
+                    self._send_json(304, None, headers)
+                else:
+                    self._send_json(200, events[(page - 1) * per_page:page * per_page], headers)
+
+            def _send_json(self, status_code: int, payload, headers: dict | None = None) -> None:
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,89 @@
+"""
+Synthetic data for the benchmarks: repositories with a given activity distribution
+and their events, generated deterministically from a seed.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from benchmarks.fake_github import EVENT_TYPES
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'pareto')
+
+
+def repo_name(index: int) -> str:
+    return f'bench/repo-{index}'
+
+
+def distribute_events(total_events: int, repos: int, distribution: str = 'uniform') -> list:
+    """
+    Splits a number of events between repositories according to an activity distribution.
+
+    - `uniform`: every repository has the same activity.
+    - `zipf`: the activity of the n-th repository is proportional to 1/n, a few are
+      very busy and most are quiet.
+    - `pareto`: 20% of the repositories have 80% of the events, the others share the rest.
+
+    Args:
+        total_events (int): The number of events.
+        repos (int): The number of repositories.
+        distribution (str): The activity distribution, one of `DISTRIBUTIONS`.
+
+    Returns:
+        list: The number of events of every repository, busiest first, summing to `total_events`.
+    """
+    if distribution == 'uniform':
+        weights = [1.0] * repos
+    elif distribution == 'zipf':
+        weights = [1 / rank for rank in range(1, repos + 1)]
+    elif distribution == 'pareto':
+        busy_repos = max(repos // 5, 1)
+        weights = [0.8 / busy_repos] * busy_repos + [0.2 / max(repos - busy_repos, 1)] * (repos - busy_repos)
+    else:
+        raise ValueError(f'Unknown activity distribution: {distribution}')
+
+    total_weight = sum(weights)
+    shares = [total_events * weight / total_weight for weight in weights]
+    counts = [int(share) for share in shares]
+    # Hands the events lost to rounding down to the largest remainders
+    by_remainder = sorted(range(repos), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:total_events - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def populate_events(counts: list, now: datetime, days: float, seed: int = 0) -> None:
+    """
+    Inserts repositories named by `repo_name` and their events straight into the database,
+    spread at random over the `days` before `now`. Must run inside an application context.
+
+    Args:
+        counts (list): The number of events of every repository, see `distribute_events`.
+        now (datetime): The time of the newest possible event.
+        days (float): The length of the period the events are spread over.
+        seed (int): The seed of the random generator.
+    """
+    from database import db
+    from database.models import EventModel, RepoModel
+
+    generator = random.Random(seed)
+    db.session.execute(insert(RepoModel), [{'id': i + 1, 'name': repo_name(i)} for i in range(len(counts))])
+    span = int(days * 24 * 60 * 60)
+    event_id = 0
+    batch = []
+    for repo_index, count in enumerate(counts):
+        for _ in range(count):
+            event_id += 1
+            batch.append({
+                'id': event_id,
+                'type': generator.choice(EVENT_TYPES),
+                'created_at': now - timedelta(seconds=generator.randint(0, span)),
+                'repository_id': repo_index + 1,
+            })
+            if len(batch) == 10000:
+                db.session.execute(insert(EventModel), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(EventModel), batch)
+    db.session.commit()
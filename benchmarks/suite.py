@@ -0,0 +1,232 @@
+"""
+Runs the whole pipeline against synthetic data and a local fake GitHub API, and writes
+the results as JSON so that runs on different commits can be compared.
+
+Stages:
+- sync: one synchronization pass over fresh repositories, repositories and events per second.
+- ingestion: bulk event ingestion, rows per second.
+- stats: latency percentiles of the statistics endpoints under concurrent load over HTTP.
+
+Every stage also reports the peak resident memory of the process after it, and with
+`--trace-memory` the peak of the Python allocations during it (which slows it down).
+
+Usage:
+    python -m benchmarks.suite --repos 200 --events 100000 --distribution zipf --output results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import UTC, datetime, timedelta
+
+from werkzeug.serving import make_server
+
+from benchmarks.bench_ingestion import run_ingestion, save_events_in_bulk
+from benchmarks.bench_login import hammer, percentile
+from benchmarks.fake_github import FakeGitHub
+from benchmarks.generators import DISTRIBUTIONS, distribute_events, populate_events, repo_name
+
+STAGES = ('sync', 'ingestion', 'stats')
+STATS_REPOS_PER_USER = 5
+
+
+def make_app(tmp_dir: str, **config):
+    from app import create_app
+
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}',
+        'JWT_SECRET_KEY': 'bench-secret-key-of-at-least-32-bytes',
+        'RATELIMIT_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_WORKERS': 0,
+        **config,
+    })
+
+
+def run_sync_stage(args) -> dict:
+    from api_requests.github_requests import EVENTS_PER_PAGE, MAX_EVENTS_PAGES
+    from database import db
+    from database.functions import synchronize_db_events
+    from database.models import EventModel, RepoModel
+
+    # A synchronization reads at most MAX_EVENTS_PAGES pages of events per repository
+    max_events = EVENTS_PER_PAGE * MAX_EVENTS_PAGES
+    counts = [min(count, max_events) for count in distribute_events(args.events, args.repos, args.distribution)]
+    repo_events = {repo_name(i): count for i, count in enumerate(counts)}
+
+    with FakeGitHub(latency=args.latency, repo_events=repo_events) as fake, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        app = make_app(tmp_dir, GITHUB_API_URL=fake.url, SYNC_MAX_WORKERS=args.workers)
+        with app.app_context():
+            db.session.add_all(RepoModel(name=name) for name in repo_events)
+            db.session.commit()
+
+            start = time.perf_counter()
+            synchronize_db_events()
+            elapsed = time.perf_counter() - start
+
+            saved_events = EventModel.query.count()
+            db.engine.dispose()
+
+    return {
+        'repos': args.repos,
+        'events': saved_events,
+        'github_requests': fake.requests_count,
+        'duration_seconds': elapsed,
+        'repos_per_second': args.repos / elapsed,
+        'events_per_second': saved_events / elapsed,
+    }
+
+
+def run_ingestion_stage(args) -> dict:
+    events_per_repo = max(args.events // args.repos, 1)
+    rows_per_second = run_ingestion(save_events_in_bulk, args.repos, events_per_repo)
+    return {
+        'repos': args.repos,
+        'events_per_repo': events_per_repo,
+        'rows_per_second': rows_per_second,
+    }
+
+
+def run_stats_stage(args) -> dict:
+    from database import db
+    from database.functions import add_user_repo_links
+    from database.models import RepoModel
+
+    now = datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+    counts = distribute_events(args.events, args.repos, args.distribution)
+    users = (args.repos + STATS_REPOS_PER_USER - 1) // STATS_REPOS_PER_USER
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = make_app(tmp_dir)
+        with app.app_context():
+            populate_events(counts, now, days=14, seed=args.seed)
+            RepoModel.query.update({'last_synced': now})
+            db.session.commit()
+
+        client = app.test_client()
+        tokens = []
+        for user in range(users):
+            response = client.post('/auth/register', json={'username': f'user-{user}', 'password': 'password'})
+            tokens.append(response.get_json()['access_token'])
+            with app.app_context():
+                first_repo = user * STATS_REPOS_PER_USER
+                add_user_repo_links(user + 1, [
+                    repo_name(i) for i in range(first_repo, min(first_repo + STATS_REPOS_PER_USER, args.repos))
+                ])
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        since = (now - timedelta(days=7)).isoformat() + 'Z'
+
+        endpoints = {
+            'all_stats': lambda user: (f'{base_url}/repository/all/stats', {}),
+            'window_stats': lambda user: (
+                f'{base_url}/repository/stats?since={since}&bucket=day',
+                {'json': {'owner': 'bench', 'name': f'repo-{user * STATS_REPOS_PER_USER}'}},
+            ),
+        }
+        latencies = {name: [] for name in endpoints}
+        deadline = time.perf_counter() + args.duration
+        threads = []
+        for client_index in range(args.clients):
+            name = list(endpoints)[client_index % len(endpoints)]
+            user = client_index % users
+            url, request_kwargs = endpoints[name](user)
+            request_kwargs['headers'] = {'Authorization': f'Bearer {tokens[user]}'}
+            threads.append(threading.Thread(target=hammer, args=(url, request_kwargs, deadline, latencies[name])))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        server.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+
+    return {
+        name: {
+            'requests': len(values),
+            'requests_per_second': len(values) / args.duration,
+            'p50_ms': statistics.median(values) * 1000,
+            'p90_ms': percentile(values, 90),
+            'p99_ms': percentile(values, 99),
+        }
+        for name, values in latencies.items() if values
+    }
+
+
+def get_metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'started_at': datetime.now(UTC).isoformat(),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repos', type=int, default=200)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='zipf')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake GitHub latency in seconds')
+    parser.add_argument('--workers', type=int, default=10, help='SYNC_MAX_WORKERS of the sync stage')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients of the stats stage')
+    parser.add_argument('--duration', type=float, default=10, help='length of the stats stage in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='trace the peak Python allocations')
+    parser.add_argument('--output', help='write the results to this file instead of the standard output')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    stage_runners = {'sync': run_sync_stage, 'ingestion': run_ingestion_stage, 'stats': run_stats_stage}
+    results = {}
+    for stage in args.stages:
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        results[stage] = stage_runners[stage](args)
+        results[stage]['stage_seconds'] = time.perf_counter() - start
+        if args.trace_memory:
+            results[stage]['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        # Kilobytes on Linux
+        results[stage]['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        print(f'{stage} done in {results[stage]["stage_seconds"]:.1f} s', file=sys.stderr)
+
+    report = {
+        'metadata': get_metadata(),
+        'parameters': {name: value for name, value in vars(args).items() if name != 'output'},
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
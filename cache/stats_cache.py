@@ -0,0 +1,150 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    An in-process, thread-safe LRU cache whose entries expire after a time to live.
+
+    Args:
+        max_size (int): The maximum number of entries, the least recently used are evicted first.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCache:
+    """
+    A cache shared between processes, stored in Redis. Requires the `redis` package.
+
+    Args:
+        url (str): The Redis connection URL, for example 'redis://localhost:6379/0'.
+        client: An already created client with the `redis.Redis` interface, used instead of `url`.
+    """
+
+    def __init__(self, url: str | None = None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def get(self, key: str):
+        value = self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self._client.set(key, json.dumps(value), px=max(int(ttl * 1000), 1))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+class StatsCache:
+    """
+    Caches the event statistics of repositories between synchronizations.
+
+    Statistics only change when they are recomputed, so every entry is stored under the
+    repository name together with the `stats_updated_at` it was computed for, and is only
+    returned for the same `stats_updated_at`. Synchronization also invalidates the entries
+    of the repositories whose events were saved or deleted, while polls without new events
+    keep them. Entries live at most `STATS_CACHE_TTL` seconds and never past
+    `RepoModel.stats_expires_at`, when the statistics window moves on its own.
+
+    The cache is local to the process and holds at most `STATS_CACHE_SIZE` repositories,
+    unless `STATS_CACHE_REDIS_URL` is set to share it between processes.
+    """
+
+    key_prefix = 'stats:'
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config['STATS_CACHE_TTL']
+        if app.config.get('STATS_CACHE_REDIS_URL'):
+            self.backend = RedisCache(app.config['STATS_CACHE_REDIS_URL'])
+        else:
+            self.backend = LocalCache(app.config['STATS_CACHE_SIZE'])
+
+    def get(self, repo) -> dict | None:
+        """
+        Returns the cached statistics of a repository, or None if there are none for its
+        current `stats_updated_at`.
+
+        Args:
+            repo (RepoModel): The repository.
+        """
+        if self.backend is None:
+            return None
+        entry = self.backend.get(self.key_prefix + repo.name)
+        if entry is None or entry['stats_updated_at'] != str(repo.stats_updated_at):
+            return None
+        return entry['statistics']
+
+    def set(self, repo, statistics: dict) -> None:
+        """
+        Caches the statistics of a repository for its current `stats_updated_at`.
+
+        Args:
+            repo (RepoModel): The repository.
+            statistics (dict): The statistics, as returned by `get_events_statistics`.
+        """
+        if self.backend is None:
+            return
+        ttl = self.ttl
+        if repo.stats_expires_at is not None:
+            ttl = min(ttl, (repo.stats_expires_at - datetime.now(UTC).replace(tzinfo=None)).total_seconds())
+        if ttl <= 0:
+            return
+        entry = {'stats_updated_at': str(repo.stats_updated_at), 'statistics': statistics}
+        self.backend.set(self.key_prefix + repo.name, entry, ttl)
+
+    def invalidate(self, repo_name: str) -> None:
+        """
+        Removes the cached statistics of a repository.
+
+        Args:
+            repo_name (str): The name of the repository in the format 'owner/repo'.
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(self.key_prefix + repo_name)
+        except Exception as error:
+            logger.error(f'Error while invalidating cached statistics for {repo_name}: {error}')
+
+
+stats_cache = StatsCache()
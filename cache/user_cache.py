@@ -0,0 +1,58 @@
+from cache.stats_cache import LocalCache
+
+
+class UserCache:
+    """
+    Caches the users of authenticated requests, so that protected endpoints don't
+    look up the user and their repositories on every request.
+
+    Every entry holds the `id`, the `username` and the `repo_ids` of a user and lives
+    at most `USER_CACHE_TTL` seconds. The functions that change the repositories of a
+    user invalidate its entry. The cache is local to the process and holds at most
+    `USER_CACHE_SIZE` users, so other processes may see a change only once their entry
+    expires.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.backend = LocalCache(app.config['USER_CACHE_SIZE'])
+
+    def get(self, user_id: int) -> dict | None:
+        """
+        Returns the cached user, or None if it is not cached.
+
+        Args:
+            user_id (int): The ID of the user.
+        """
+        if self.backend is None:
+            return None
+        return self.backend.get(user_id)
+
+    def set(self, user: dict) -> None:
+        """
+        Caches a user.
+
+        Args:
+            user (dict): The user, as returned by `get_user`.
+        """
+        if self.backend is None or self.ttl <= 0:
+            return
+        self.backend.set(user['id'], user, self.ttl)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Removes a cached user.
+
+        Args:
+            user_id (int): The ID of the user.
+        """
+        if self.backend is None:
+            return
+        self.backend.delete(user_id)
+
+
+user_cache = UserCache()
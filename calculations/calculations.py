@@ -1,8 +1,10 @@
 from datetime import UTC, datetime, timedelta
 
-import pandas as pd
+from sqlalchemy import func, select
 
-from database.functions import convert_events_to_df
+from database import db
+from database.functions import STATS_WINDOW_DAYS, STATS_WINDOW_EVENTS
+from database.models import EventModel, RepoModel
 
 
 def calculate_events_statistics(repo_name: str) -> dict:
@@ -14,26 +16,49 @@ def calculate_events_statistics(repo_name: str) -> dict:
     in the last 7 days. If the repository has fewer than 500 events in the past week,
     all events are analyzed. Otherwise, the most recent 500 events are used.
 
+    This is the reference definition of the statistics: the API serves the precomputed
+    ones from `get_events_statistics`, and the tests check that they match this function.
+    The window is selected in the database, and its events are streamed from the cursor
+    ordered by type and time, so the deltas are summed in one pass.
+
     Args:
         repo_name (str): The name of the repository in the format 'owner/repo'.
 
     Returns:
-        dict: A dictionary where keys are event types, and values are the average time 
+        dict: A dictionary where keys are event types, and values are the average time
               difference in seconds between events of that type.
     """
-    df = convert_events_to_df(repo_name)
-    week_ago_date = (datetime.now(UTC) - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
-    last_week_events = df[df.created_at > week_ago_date]
+    repo_id = db.session.execute(select(RepoModel.id).where(RepoModel.name == repo_name)).scalar()
+    week_ago = datetime.now(UTC) - timedelta(days=STATS_WINDOW_DAYS)
+    last_week_count = db.session.execute(
+        select(func.count()).where(EventModel.repository_id == repo_id, EventModel.created_at > week_ago)
+    ).scalar()
 
-    if len(last_week_events) <= 500 and len(last_week_events) > 0:
-        data = last_week_events
+    window = select(EventModel.type, EventModel.created_at).where(EventModel.repository_id == repo_id)
+    if 0 < last_week_count <= STATS_WINDOW_EVENTS:
+        window = window.where(EventModel.created_at > week_ago)
     else:
-        data = df.head(500)
-    
-    # Convert the 'created_at' column to datetime
-    data['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-
-    # Calculates the average time delta for each event type
-    data['time_delta'] = data.groupby('type')['created_at'].diff(1).dt.total_seconds().abs()
-    average_data = data.groupby('type')['time_delta'].mean().fillna(0).round(3)
-    return average_data.to_dict()
\ No newline at end of file
+        window = window.order_by(EventModel.created_at.desc()).limit(STATS_WINDOW_EVENTS)
+    window = window.subquery()
+
+    rows = db.session.execute(
+        select(window.c.type, window.c.created_at).order_by(window.c.type, window.c.created_at),
+        execution_options={"yield_per": 1000},
+    )
+    statistics = {}
+    current_type = previous_created_at = None
+    delta_sum = delta_count = 0
+    for event_type, created_at in rows:
+        if event_type != current_type:
+            if current_type is not None:
+                statistics[current_type] = round(delta_sum / delta_count, 3) if delta_count else 0.0
+            current_type, delta_sum, delta_count = event_type, 0.0, 0
+        else:
+            delta_sum += (created_at - previous_created_at).total_seconds()
+            delta_count += 1
+        previous_created_at = created_at
+    if current_type is not None:
+        statistics[current_type] = round(delta_sum / delta_count, 3) if delta_count else 0.0
+
+    db.session.close()
+    return statistics
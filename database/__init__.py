@@ -1,3 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 
 db = SQLAlchemy()
+
+
+def get_engine_options(config) -> dict:
+    """
+    Builds the SQLAlchemy engine options for the configured database.
+
+    PostgreSQL (and other server databases) get a connection pool sized by
+    `DATABASE_POOL_SIZE`/`DATABASE_MAX_OVERFLOW`, and their sessions use UTC so that
+    timestamps compare the same way as in SQLite. SQLite keeps the default pool.
+
+    Args:
+        config: The Flask application config.
+
+    Returns:
+        dict: The options for `SQLALCHEMY_ENGINE_OPTIONS`.
+    """
+    options = {
+        'pool_pre_ping': config['DATABASE_POOL_PRE_PING'],
+        'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+    }
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend != 'sqlite':
+        options['pool_size'] = config['DATABASE_POOL_SIZE']
+        options['max_overflow'] = config['DATABASE_MAX_OVERFLOW']
+    if backend == 'postgresql':
+        options['connect_args'] = {'options': '-c timezone=utc'}
+    return options
+
+
+def enable_sqlite_wal(engine: Engine, busy_timeout: int) -> None:
+    """
+    Makes every new SQLite connection of the engine use write-ahead logging and wait
+    up to `busy_timeout` milliseconds for locks instead of failing immediately.
+
+    With WAL, the synchronization writer no longer blocks the API readers, and readers
+    no longer block it.
+
+    Args:
+        engine (Engine): The engine, nothing is done unless it is a SQLite one.
+        busy_timeout (int): The lock timeout in milliseconds.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.close()
@@ -1,14 +1,31 @@
 import logging
 from datetime import UTC, datetime, timedelta
-import pandas as pd
+from flask import current_app
+from sqlalchemy import Float, case, cast, delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from api_requests.github_requests import get_events
-from database.models import EventModel, RepoModel, UserModel, UserRepoModel
+from api_requests.github_requests import EVENTS_PER_PAGE, MAX_EVENTS_PAGES, get_events_concurrently, github_client
+from cache.stats_cache import stats_cache
+from cache.user_cache import user_cache
+from metrics.metrics import events_ingested, stats_duration, sync_duration, sync_repositories
+from database.models import EventModel, EventStatsModel, PendingEventModel, RepoModel, UserModel, UserRepoModel
 from . import db
 
 
 logger = logging.getLogger(__name__)
 
+RETENTION_COUNT = 'count'
+RETENTION_DAYS = 'days'
+
+STATS_WINDOW_DAYS = 7
+STATS_WINDOW_EVENTS = 500
+STATS_PERCENTILES = (50, 90, 99)
+STATS_BUCKET_FORMATS = {
+    'hour': ('%Y-%m-%dT%H:00:00Z', 'YYYY-MM-DD"T"HH24":00:00Z"'),
+    'day': ('%Y-%m-%dT00:00:00Z', 'YYYY-MM-DD"T00:00:00Z"'),
+}
+
 def check_if_user_exists(username: str) -> bool:
     """
     Checks if a user exists in the database by username.
@@ -21,6 +38,34 @@ def check_if_user_exists(username: str) -> bool:
     """
     return UserModel.query.filter_by(username=username).first() is not None
 
+def get_user(user_id: int | None = None, username: str | None = None) -> dict | None:
+    """
+    Returns a user with the IDs of their repositories, looked up by ID or by username
+    with a single query.
+
+    Args:
+        user_id (int | None): The ID of the user.
+        username (str | None): The username, used if `user_id` is None.
+
+    Returns:
+        dict | None: A dict with the `id`, `username` and `repo_ids` of the user,
+                     or None if the user does not exist.
+    """
+    condition = UserModel.id == user_id if user_id is not None else UserModel.username == username
+    rows = db.session.execute(
+        select(UserModel.id, UserModel.username, UserRepoModel.repo_id)
+        .outerjoin(UserRepoModel, UserRepoModel.user_id == UserModel.id)
+        .where(condition)
+        .order_by(UserRepoModel.repo_id)
+    ).all()
+    if not rows:
+        return None
+    return {
+        "id": rows[0].id,
+        "username": rows[0].username,
+        "repo_ids": [row.repo_id for row in rows if row.repo_id is not None],
+    }
+
 def check_user_repo_link(user_id: int, repo_id: int) -> bool:
     """
     Checks if a repository is linked to a user.
@@ -35,9 +80,41 @@ def check_user_repo_link(user_id: int, repo_id: int) -> bool:
     existing_link = UserRepoModel.query.filter_by(user_id=user_id, repo_id=repo_id).first()
     return existing_link is not None
 
+def count_user_repos(user_id: int) -> int:
+    """
+    Returns the number of repositories linked to a user, counted by the database.
+
+    Args:
+        user_id (int): The ID of the user.
+    """
+    return db.session.execute(
+        select(func.count()).select_from(UserRepoModel).where(UserRepoModel.user_id == user_id)
+    ).scalar()
+
+def get_user_repos(user_id: int, after: int = 0, limit: int | None = None) -> list:
+    """
+    Returns the repositories linked to a user in the order of their IDs, starting after
+    a cursor, so that a list of any length can be read a page at a time.
+
+    Args:
+        user_id (int): The ID of the user.
+        after (int): The ID of the last repository of the previous page, 0 for the first page.
+        limit (int | None): The maximum number of repositories, all of them if None.
+
+    Returns:
+        list: The repositories (RepoModel).
+    """
+    query = RepoModel.query.join(UserRepoModel, UserRepoModel.repo_id == RepoModel.id).filter(
+        UserRepoModel.user_id == user_id, RepoModel.id > after
+    ).order_by(RepoModel.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
 def add_user_repo_link(user_id: int, repo_id: int) -> tuple:
     """
-    Adds a link between a user and a repository if the user has fewer than 5 repositories.
+    Adds a link between a user and a repository if the user has fewer repositories than
+    their quota, `USER_REPO_QUOTA`.
 
     Args:
         user_id (int): The ID of the user.
@@ -46,16 +123,63 @@ def add_user_repo_link(user_id: int, repo_id: int) -> tuple:
     Returns:
         tuple: A tuple (bool, str) indicating success or failure and a message.
     """
+    quota = current_app.config['USER_REPO_QUOTA']
     if check_user_repo_link(user_id, repo_id):
         return False, 'Repository is already added'
-    elif len(UserRepoModel.query.filter_by(user_id=user_id).all()) >= 5:
-        return False, 'You cannot add more than 5 repositories'
+    elif count_user_repos(user_id) >= quota:
+        return False, f'You cannot add more than {quota} repositories'
     else:
         new_link = UserRepoModel(user_id=user_id, repo_id=repo_id)
         db.session.add(new_link)
         db.session.commit()
+        user_cache.invalidate(user_id)
         return True, 'Repository was added'
 
+def add_user_repo_links(user_id: int, repo_names: list) -> dict:
+    """
+    Adds links between a user and many repositories in a single transaction, creating
+    the repositories that are not tracked yet. As in `add_user_repo_link`, the
+    repositories beyond the quota of the user are not added.
+
+    Args:
+        user_id (int): The ID of the user.
+        repo_names (list): The full names of the repositories in the format 'owner/repo'.
+
+    Returns:
+        dict: A dictionary where keys are repository names, and values are tuples
+              (bool, str) indicating success or failure and a message.
+    """
+    repos = {repo.name: repo for repo in RepoModel.query.filter(RepoModel.name.in_(repo_names))}
+    linked_repo_ids = set(db.session.execute(
+        select(UserRepoModel.repo_id).where(
+            UserRepoModel.user_id == user_id, UserRepoModel.repo_id.in_([repo.id for repo in repos.values()])
+        )
+    ).scalars())
+    links_count = count_user_repos(user_id)
+    quota = current_app.config['USER_REPO_QUOTA']
+
+    results = {}
+    linked_repo_names = []
+    for repo_name in repo_names:
+        repo = repos.get(repo_name)
+        if repo is not None and repo.id in linked_repo_ids:
+            results[repo_name] = (False, 'Repository is already added')
+        elif links_count >= quota:
+            results[repo_name] = (False, f'You cannot add more than {quota} repositories')
+        else:
+            results[repo_name] = (True, 'Repository was added')
+            linked_repo_names.append(repo_name)
+            links_count += 1
+
+    new_repos = [RepoModel(name=repo_name) for repo_name in linked_repo_names if repo_name not in repos]
+    db.session.add_all(new_repos)
+    db.session.flush()
+    repos.update((repo.name, repo) for repo in new_repos)
+    db.session.add_all(UserRepoModel(user_id=user_id, repo_id=repos[repo_name].id) for repo_name in linked_repo_names)
+    db.session.commit()
+    user_cache.invalidate(user_id)
+    return results
+
 def delete_user_repo_link(user_id: int, repo_id: int) -> tuple:
     """
     Deletes the link between a user and a repository.
@@ -69,97 +193,810 @@ def delete_user_repo_link(user_id: int, repo_id: int) -> tuple:
     """
     rows = UserRepoModel.query.filter_by(user_id=user_id, repo_id=repo_id).delete()
     db.session.commit()
+    user_cache.invalidate(user_id)
     if rows > 0:
         return True, 'Repository was removed'
     else:
         return False, 'You do not have this repository'
 
-def save_new_event(event: dict, repo: RepoModel) -> None:
+def delete_user_repo_links(user_id: int, repo_names: list) -> dict:
     """
-    Saves a new event to the database if it does not already exist.
+    Deletes the links between a user and many repositories in a single transaction.
 
     Args:
-        event (dict): The event data as a dictionary.
-        repo (RepoModel): The repository associated with the event.
+        user_id (int): The ID of the user.
+        repo_names (list): The full names of the repositories in the format 'owner/repo'.
+
+    Returns:
+        dict: A dictionary where keys are repository names, and values are tuples
+              (bool, str) indicating success or failure and a message.
     """
-    event_existence = EventModel.query.filter_by(id=event['id']).first()
-    if not event_existence:
-        new_event = EventModel(
-            id=event['id'],
-            type=event['type'],
-            created_at=datetime.strptime(event['created_at'], "%Y-%m-%dT%H:%M:%SZ"),
-            repository=repo
+    linked_repos = dict(db.session.execute(
+        select(RepoModel.name, RepoModel.id).join(UserRepoModel, UserRepoModel.repo_id == RepoModel.id).where(
+            UserRepoModel.user_id == user_id, RepoModel.name.in_(repo_names)
         )
-        db.session.add(new_event)
-        db.session.commit()
+    ).all())
+    db.session.execute(
+        delete(UserRepoModel).where(
+            UserRepoModel.user_id == user_id, UserRepoModel.repo_id.in_(linked_repos.values())
+        )
+    )
+    db.session.commit()
+    user_cache.invalidate(user_id)
+    return {
+        repo_name: (True, 'Repository was removed') if repo_name in linked_repos
+        else (False, 'You do not have this repository')
+        for repo_name in repo_names
+    }
 
-def delete_extra_events(repo_id: int) -> None:
+def dialect_insert(model):
+    """
+    Returns an INSERT statement for a model in the dialect of the database, SQLite or
+    PostgreSQL, which both support `ON CONFLICT` clauses.
     """
-    Deletes events if there are more than 500 for the given repository to save storage space.
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql_insert(model)
+    return sqlite_insert(model)
+
+def save_new_events(events: list, repo_id: int) -> int:
+    """
+    Saves a page of events to the database in a single statement, skipping the ones
+    that already exist.
+
+    Duplicates are skipped by the database itself with `INSERT ... ON CONFLICT DO NOTHING`,
+    so no lookups are needed. The caller commits.
+
+    Args:
+        events (list): The events data as dictionaries, as returned by the GitHub API.
+        repo_id (int): The ID of the repository associated with the events.
+
+    Returns:
+        int: The number of new events saved.
+    """
+    if not events:
+        return 0
+
+    rows = [
+        {
+            "id": int(event['id']),
+            "type": event['type'],
+            "created_at": datetime.strptime(event['created_at'], "%Y-%m-%dT%H:%M:%SZ"),
+            "repository_id": repo_id,
+        }
+        for event in events
+    ]
+
+    statement = dialect_insert(EventModel).values(rows).on_conflict_do_nothing(index_elements=['id'])
+    return db.session.execute(statement).rowcount
+
+def delete_extra_events(repo_id: int, policy: str, limit: int) -> int:
+    """
+    Deletes the events of the given repository that fall outside its retention policy
+    to save storage space. The deletion is a single statement, and the caller commits.
 
     Args:
         repo_id (int): The ID of the repository.
+        policy (str): `RETENTION_COUNT` to keep the `limit` newest events, or
+                      `RETENTION_DAYS` to keep the events of the last `limit` days.
+        limit (int): The number of events or days to keep.
+
+    Returns:
+        int: The number of deleted events.
+
+    Raises:
+        ValueError: If the policy is unknown.
+    """
+    if policy == RETENTION_COUNT:
+        newest_events = select(EventModel.id).where(
+            EventModel.repository_id == repo_id
+        ).order_by(EventModel.created_at.desc()).limit(limit)
+        condition = EventModel.id.not_in(newest_events)
+    elif policy == RETENTION_DAYS:
+        condition = EventModel.created_at < datetime.now(UTC) - timedelta(days=limit)
+    else:
+        raise ValueError(f'Unknown retention policy: {policy}')
+
+    statement = delete(EventModel).where(EventModel.repository_id == repo_id, condition)
+    return db.session.execute(statement).rowcount
+
+
+def save_events_statistics(rows: list) -> None:
     """
-    event_count = EventModel.query.filter_by(repository_id=repo_id).count()
-    if event_count > 500:
-        oldest_events = EventModel.query.filter_by(repository_id=repo_id).order_by(EventModel.created_at).limit(event_count - 500).all()
-        for event in oldest_events:
-            db.session.delete(event)
+    Inserts or updates precomputed event statistics in a single statement.
+
+    The rows are upserted with `INSERT ... ON CONFLICT DO UPDATE`, so that two refreshes
+    of the same repository at the same time, by two requests or by a request and the
+    worker, don't conflict on the primary key.
+    The caller commits.
+
+    Args:
+        rows (list): The statistics as dictionaries of `EventStatsModel` columns.
+    """
+    if not rows:
+        return
+
+    columns = ('event_count', 'delta_sum', 'first_event_at', 'last_event_at')
+    statement = dialect_insert(EventStatsModel).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['repository_id', 'type'],
+        set_={column: statement.excluded[column] for column in columns},
+    )
+    db.session.execute(statement)
+
+@stats_duration.time(kind='refresh')
+def refresh_events_statistics(repo_ids: list) -> None:
+    """
+    Recomputes the precomputed event statistics of the given repositories.
+
+    The statistics window is the same as in `calculate_events_statistics`: the events
+    of the last 7 days if there are at most 500 of them, and the 500 newest events
+    otherwise. For every repository and event type the count, the first and last
+    timestamps and the sum of the time deltas between consecutive events are stored.
+    As the events are ordered, the sum of the deltas is the time between the first
+    and the last event.
+
+    All the repositories are handled together with a fixed number of queries, ranking
+    the events of each repository with a window function and grouping the window by
+    repository and event type.
+
+    The window slides as events get older, so the time at which it will change without
+    new events is stored in `RepoModel.stats_expires_at`. The caller commits.
+
+    Args:
+        repo_ids (list): The IDs of the repositories.
+    """
+    if not repo_ids:
+        return
+
+    now = datetime.now(UTC)
+    week_ago = now - timedelta(days=STATS_WINDOW_DAYS)
+    last_week_counts = dict(db.session.execute(
+        select(EventModel.repository_id, func.count())
+        .where(EventModel.repository_id.in_(repo_ids), EventModel.created_at > week_ago)
+        .group_by(EventModel.repository_id)
+    ).all())
+    last_week_repo_ids = [
+        repo_id for repo_id, count in last_week_counts.items() if count <= STATS_WINDOW_EVENTS
+    ]
+    busy_repo_ids = [
+        repo_id for repo_id, count in last_week_counts.items() if count > STATS_WINDOW_EVENTS
+    ]
+
+    ranked_events = select(
+        EventModel.repository_id,
+        EventModel.type,
+        EventModel.created_at,
+        func.row_number().over(
+            partition_by=EventModel.repository_id, order_by=EventModel.created_at.desc()
+        ).label('position'),
+    ).where(EventModel.repository_id.in_(repo_ids)).subquery()
+
+    in_window = (
+        (ranked_events.c.repository_id.in_(last_week_repo_ids) & (ranked_events.c.created_at > week_ago))
+        | (ranked_events.c.repository_id.not_in(last_week_repo_ids) & (ranked_events.c.position <= STATS_WINDOW_EVENTS))
+    )
+    rows = db.session.execute(
+        select(
+            ranked_events.c.repository_id,
+            ranked_events.c.type,
+            func.count().label('event_count'),
+            func.min(ranked_events.c.created_at).label('first_event_at'),
+            func.max(ranked_events.c.created_at).label('last_event_at'),
+        ).where(in_window).group_by(ranked_events.c.repository_id, ranked_events.c.type)
+    ).all()
+
+    expires_at = dict.fromkeys(repo_ids)
+    for row in rows:
+        # The window shrinks when its oldest event becomes older than a week
+        if row.repository_id in last_week_repo_ids:
+            row_expires_at = row.first_event_at + timedelta(days=STATS_WINDOW_DAYS)
+            if expires_at[row.repository_id] is None or row_expires_at < expires_at[row.repository_id]:
+                expires_at[row.repository_id] = row_expires_at
+    if busy_repo_ids:
+        # The window switches to the last week when at most 500 events are left in it
+        oldest_outside_window = db.session.execute(
+            select(ranked_events.c.repository_id, ranked_events.c.created_at).where(
+                ranked_events.c.repository_id.in_(busy_repo_ids),
+                ranked_events.c.position == STATS_WINDOW_EVENTS + 1,
+            )
+        ).all()
+        for repo_id, created_at in oldest_outside_window:
+            expires_at[repo_id] = created_at + timedelta(days=STATS_WINDOW_DAYS)
+
+    # Event types that left the window
+    stale_statistics = delete(EventStatsModel).where(EventStatsModel.repository_id.in_(repo_ids))
+    if rows:
+        stale_statistics = stale_statistics.where(
+            tuple_(EventStatsModel.repository_id, EventStatsModel.type).not_in(
+                [(row.repository_id, row.type) for row in rows]
+            )
+        )
+    db.session.execute(stale_statistics)
+    save_events_statistics([
+        {
+            "repository_id": row.repository_id,
+            "type": row.type,
+            "event_count": row.event_count,
+            "delta_sum": (row.last_event_at - row.first_event_at).total_seconds(),
+            "first_event_at": row.first_event_at,
+            "last_event_at": row.last_event_at,
+        }
+        for row in rows
+    ])
+    db.session.execute(
+        update(RepoModel),
+        [
+            {"id": repo_id, "stats_updated_at": now, "stats_expires_at": repo_expires_at}
+            for repo_id, repo_expires_at in expires_at.items()
+        ],
+    )
+
+@stats_duration.time(kind='precomputed')
+def get_events_statistics(repos: list) -> dict:
+    """
+    Returns the average time delta between events of each type for the given repositories
+    from the precomputed statistics, refreshing the out of date ones first.
+
+    The statistics of all the repositories are read with a single query.
+
+    Args:
+        repos (list): The repositories (RepoModel).
+
+    Returns:
+        dict: A dictionary where keys are repository IDs, and values are dictionaries
+              where keys are event types, and values are the average time difference
+              in seconds between events of that type.
+    """
+    now = datetime.now(UTC).replace(tzinfo=None)
+    statistics = {repo.id: {} for repo in repos}
+    outdated_repo_ids = [
+        repo.id for repo in repos
+        if repo.stats_updated_at is None or (repo.stats_expires_at is not None and repo.stats_expires_at <= now)
+    ]
+    if outdated_repo_ids:
+        refresh_events_statistics(outdated_repo_ids)
         db.session.commit()
+        # Reloads the repositories expired by the commit with one query instead of one each
+        RepoModel.query.filter(RepoModel.id.in_(statistics)).all()
 
+    for stats in EventStatsModel.query.filter(EventStatsModel.repository_id.in_(statistics)):
+        statistics[stats.repository_id][stats.type] = (
+            round(stats.delta_sum / (stats.event_count - 1), 3) if stats.event_count > 1 else 0.0
+        )
+    return statistics
 
-def synchronize_db_events() -> None:
+def seconds_between(later, earlier):
     """
-    Synchronizes events for repositories that have not been updated in the last 5 minutes.
-    Retrieves new events from GitHub and saves them to the database.
+    Returns a SQL expression for the number of seconds between two timestamps, as a float
+    (`extract` returns a `numeric` on PostgreSQL, which the driver reads as a `Decimal`).
     """
-    logger.info('Synchronization started')
+    if db.engine.dialect.name == 'postgresql':
+        seconds = func.extract('epoch', later - earlier)
+    else:
+        seconds = (func.julianday(later) - func.julianday(earlier)) * 86400
+    return cast(seconds, Float)
+
+def format_bucket(created_at, bucket: str):
+    """
+    Returns a SQL expression for the start of the hour or day of a timestamp, in ISO 8601.
+    """
+    strftime_format, to_char_format = STATS_BUCKET_FORMATS[bucket]
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(created_at, to_char_format)
+    return func.strftime(strftime_format, created_at)
+
+@stats_duration.time(kind='window')
+def get_events_window_statistics(repo_ids: list, since: datetime, until: datetime) -> dict:
+    """
+    Returns the statistics of the events of each type created between `since` and `until`
+    for the given repositories: the number of events, and the mean and the percentiles
+    (see `STATS_PERCENTILES`) of the time deltas between consecutive events.
+
+    Everything is computed by the database with a single query over an index range scan:
+    the deltas with the `lag` window function, and the percentiles with the rank of
+    every delta (the smallest delta with at least p% of the deltas below or equal to it).
+
+    Args:
+        repo_ids (list): The IDs of the repositories.
+        since (datetime): The start of the window, inclusive.
+        until (datetime): The end of the window, exclusive.
+
+    Returns:
+        dict: A dictionary where keys are repository IDs, and values are dictionaries
+              where keys are event types, and values are dictionaries with the
+              `event_count`, `average_delta` and `p<percentile>_delta` (in seconds,
+              0.0 with less than two events).
+    """
+    window = select(EventModel.repository_id, EventModel.type, EventModel.created_at).where(
+        EventModel.repository_id.in_(repo_ids), EventModel.created_at >= since, EventModel.created_at < until
+    ).subquery()
+    previous_created_at = func.lag(window.c.created_at).over(
+        partition_by=(window.c.repository_id, window.c.type), order_by=window.c.created_at
+    )
+    deltas = select(
+        window.c.repository_id,
+        window.c.type,
+        seconds_between(window.c.created_at, previous_created_at).label('delta'),
+    ).subquery()
+    ranked_deltas = select(
+        deltas.c.repository_id,
+        deltas.c.type,
+        deltas.c.delta,
+        # The delta of the first event of each type is NULL and ranked last
+        func.row_number().over(
+            partition_by=(deltas.c.repository_id, deltas.c.type),
+            order_by=(deltas.c.delta.is_(None), deltas.c.delta),
+        ).label('position'),
+        func.count(deltas.c.delta).over(partition_by=(deltas.c.repository_id, deltas.c.type)).label('delta_count'),
+    ).subquery()
+    rows = db.session.execute(
+        select(
+            ranked_deltas.c.repository_id,
+            ranked_deltas.c.type,
+            func.count().label('event_count'),
+            cast(func.avg(ranked_deltas.c.delta), Float).label('average_delta'),
+            *[
+                cast(func.min(case(
+                    (ranked_deltas.c.position >= ranked_deltas.c.delta_count * (percentile / 100), ranked_deltas.c.delta)
+                )), Float).label(f'p{percentile}_delta')
+                for percentile in STATS_PERCENTILES
+            ],
+        ).group_by(ranked_deltas.c.repository_id, ranked_deltas.c.type).order_by(ranked_deltas.c.type)
+    ).all()
+
+    statistics = {repo_id: {} for repo_id in repo_ids}
+    for row in rows:
+        statistics[row.repository_id][row.type] = {
+            "event_count": row.event_count,
+            "average_delta": round(float(row.average_delta or 0), 3),
+            **{
+                f'p{percentile}_delta': round(float(getattr(row, f'p{percentile}_delta') or 0), 3)
+                for percentile in STATS_PERCENTILES
+            },
+        }
+    return statistics
+
+@stats_duration.time(kind='histogram')
+def get_events_histogram(repo_ids: list, since: datetime, until: datetime, bucket: str) -> dict:
+    """
+    Returns the number of events of each type per hour or day created between `since`
+    and `until` for the given repositories, counted by the database.
+
+    Args:
+        repo_ids (list): The IDs of the repositories.
+        since (datetime): The start of the window, inclusive.
+        until (datetime): The end of the window, exclusive.
+        bucket (str): The size of the buckets, `hour` or `day`.
 
-    five_minutes_ago = datetime.now(UTC) - timedelta(minutes=5)
-    repos_to_sync = RepoModel.query.filter(
-        (RepoModel.last_synced == None) | (RepoModel.last_synced < five_minutes_ago)
+    Returns:
+        dict: A dictionary where keys are repository IDs, and values are dictionaries
+              where keys are event types, and values are dictionaries mapping the start
+              of every bucket with events (in ISO 8601) to its number of events.
+    """
+    bucket_start = format_bucket(EventModel.created_at, bucket).label('bucket_start')
+    rows = db.session.execute(
+        select(EventModel.repository_id, EventModel.type, bucket_start, func.count().label('event_count'))
+        .where(
+            EventModel.repository_id.in_(repo_ids), EventModel.created_at >= since, EventModel.created_at < until
+        )
+        .group_by(EventModel.repository_id, EventModel.type, bucket_start)
+        .order_by(EventModel.type, bucket_start)
     ).all()
 
+    histogram = {repo_id: {} for repo_id in repo_ids}
+    for row in rows:
+        histogram[row.repository_id].setdefault(row.type, {})[row.bucket_start] = row.event_count
+    return histogram
+
+def get_retention(repo, default_policy: str, default_limit: int) -> tuple:
+    """
+    Returns the retention policy and limit of a repository, using the defaults for the
+    values it does not override. An invalid override is logged and the defaults are used
+    instead, so that one repository never stops the synchronization of the others.
+
+    Args:
+        repo: The repository row, with its `name`, `retention_policy` and `retention_limit`.
+        default_policy (str): The default policy, `RETENTION_POLICY`.
+        default_limit (int): The default limit, `RETENTION_LIMIT`.
+
+    Returns:
+        tuple: The retention policy (str) and limit (int), see `delete_extra_events`.
+    """
+    policy = repo.retention_policy if repo.retention_policy is not None else default_policy
+    limit = repo.retention_limit if repo.retention_limit is not None else default_limit
+    if policy not in (RETENTION_COUNT, RETENTION_DAYS) or limit < 0:
+        logger.error(f'Invalid retention policy {policy!r} with limit {limit} for {repo.name}, using the defaults')
+        return default_policy, default_limit
+    return policy, limit
+
+def ingest_events(repo_id: int, events: list, retention_policy: str, retention_limit: int,
+                  refresh_statistics: bool = False) -> tuple[int, bool]:
+    """
+    Saves new events of a repository in bulk, trims its events to the retention policy
+    and refreshes its statistics if anything changed. The caller commits.
+
+    Args:
+        repo_id (int): The ID of the repository.
+        events (list): The events data as dictionaries, in the shape of the GitHub events API.
+        retention_policy (str): The retention policy, see `delete_extra_events`.
+        retention_limit (int): The retention limit, see `delete_extra_events`.
+        refresh_statistics (bool): Whether to refresh the statistics even if nothing changed.
+
+    Returns:
+        tuple[int, bool]: The number of new events saved, and whether the statistics were refreshed.
+    """
+    saved_events = save_new_events(events, repo_id)
+    deleted_events = delete_extra_events(repo_id, policy=retention_policy, limit=retention_limit)
+    statistics_refreshed = bool(saved_events or deleted_events or refresh_statistics)
+    if statistics_refreshed:
+        refresh_events_statistics([repo_id])
+    return saved_events, statistics_refreshed
+
+def get_sync_interval(repo_id: int, now: datetime, min_interval: int, max_interval: int,
+                      events_per_poll: int) -> float:
+    """
+    Returns how long to wait before synchronizing a repository again, based on its
+    observed event rate.
+
+    The mean time between events comes from the precomputed event statistics, and the
+    repository is polled about once every `events_per_poll` events. Repositories that
+    have been quiet for a while back off to half of their idle time, so dormant ones
+    are polled every `max_interval` seconds and busy ones every `min_interval` seconds.
+
+    Args:
+        repo_id (int): The ID of the repository.
+        now (datetime): The current time.
+        min_interval (int): The shortest interval in seconds.
+        max_interval (int): The longest interval in seconds.
+        events_per_poll (int): The number of new events to expect between two polls.
+
+    Returns:
+        float: The interval in seconds.
+    """
+    event_count, first_event_at, last_event_at = db.session.execute(
+        select(
+            func.sum(EventStatsModel.event_count),
+            func.min(EventStatsModel.first_event_at),
+            func.max(EventStatsModel.last_event_at),
+        ).where(EventStatsModel.repository_id == repo_id)
+    ).one()
+    if not event_count:
+        return max_interval
+
+    interval = min_interval
+    if event_count > 1:
+        mean_delta = (last_event_at - first_event_at).total_seconds() / (event_count - 1)
+        interval = max(interval, mean_delta * events_per_poll)
+    idle_time = (now.replace(tzinfo=None) - last_event_at).total_seconds()
+    interval = max(interval, idle_time / 2)
+    return min(interval, max_interval)
+
+def get_retry_interval(sync_failures: int, min_interval: int, max_interval: int) -> float:
+    """
+    Returns how long to wait before synchronizing a repository again after its events
+    request failed, doubling with every consecutive failure, so that a deleted or
+    inaccessible repository is not polled on every pass.
+
+    Args:
+        sync_failures (int): The number of consecutive failures, including the last one.
+        min_interval (int): The interval after the first failure, in seconds.
+        max_interval (int): The longest interval in seconds.
+
+    Returns:
+        float: The interval in seconds.
+    """
+    return min(min_interval * 2 ** min(sync_failures - 1, 32), max_interval)
+
+def get_sync_priority(repo, now: datetime, min_interval: int) -> float:
+    """
+    Returns how urgently a repository needs to be synchronized when the GitHub rate limit
+    does not allow synchronizing all of the due repositories.
+
+    Repositories with more subscribers and more events come first, and the priority of
+    every repository grows while it waits, so that none of them is postponed forever.
+    Repositories that were never synchronized come before all others.
+
+    Args:
+        repo: The repository row, with its `next_sync_at`, `subscribers` and `activity`.
+        now (datetime): The current time (naive UTC).
+        min_interval (int): The shortest synchronization interval in seconds.
+
+    Returns:
+        float: The priority, higher is more urgent.
+    """
+    if repo.next_sync_at is None:
+        return float('inf')
+    waiting_time = (now - repo.next_sync_at).total_seconds() + min_interval
+    return (1 + repo.subscribers) * (1 + repo.activity) ** 0.5 * waiting_time
+
+def get_expected_requests(repo, now: datetime) -> int:
+    """
+    Returns how many GitHub requests the next synchronization of a repository is expected
+    to make, one per page of events, so that the rate limit budget is charged by requests.
+
+    The number of new events is estimated from the mean time between events of the
+    precomputed statistics and the time since the last synchronization. Repositories
+    without a cursor read all the available pages.
+
+    Args:
+        repo: The repository row, with its `last_event_id`, `last_synced`, `activity`,
+              `stats_first_event_at` and `stats_last_event_at`.
+        now (datetime): The current time (naive UTC).
+
+    Returns:
+        int: The number of requests, between 1 and `MAX_EVENTS_PAGES`.
+    """
+    if repo.last_event_id is None:
+        return MAX_EVENTS_PAGES
+    if repo.activity < 2 or repo.last_synced is None or repo.stats_last_event_at <= repo.stats_first_event_at:
+        return 1
+    mean_delta = (repo.stats_last_event_at - repo.stats_first_event_at).total_seconds() / (repo.activity - 1)
+    expected_events = (now - repo.last_synced).total_seconds() / mean_delta
+    # Pages are read until one has a known event, so a full page of new events costs one more request
+    return min(int(expected_events // EVENTS_PER_PAGE) + 1, MAX_EVENTS_PAGES)
+
+@sync_duration.time()
+def synchronize_db_events(shard_index: int = 0, shard_count: int = 1, keep_alive=None) -> None:
+    """
+    Synchronizes events for repositories whose next synchronization time has come.
+    Retrieves new events from GitHub concurrently and saves them to the database.
+
+    The repositories can be split between several workers: each one only synchronizes
+    the repositories whose ID modulo `shard_count` is `shard_index`.
+
+    The GitHub requests run on a bounded pool of `SYNC_MAX_WORKERS` threads, while
+    all database writes are done here, in the calling thread, as results arrive.
+    The events of each repository are saved in bulk, trimmed to its retention policy
+    (`RETENTION_POLICY`/`RETENTION_LIMIT` unless set on the repository, see
+    `get_retention`) and committed in one transaction, together with the refreshed
+    event statistics.
+    Requests are conditional on the stored `ETag`/`Last-Modified` values, and a 304
+    response skips saving events altogether. Otherwise only the events newer than the
+    stored cursor (`RepoModel.last_event_id`) are fetched, across as many pages as
+    needed. The next synchronization of every repository is scheduled according to its
+    event rate (see `get_sync_interval`), but never before the `X-Poll-Interval`
+    requested by GitHub. A repository whose request fails is retried with an exponential
+    backoff (see `get_retry_interval`), unless it failed because of the rate limit, and
+    then it stays due. The index on `RepoModel.next_sync_at` serves as the queue of
+    due repositories.
+
+    Repositories that received a webhook delivery in the last `WEBHOOK_STALE_AFTER`
+    seconds are left to the webhook. When their webhook goes quiet they are polled
+    again, skipping the events created between the first and the last delivery since
+    the previous poll, which the webhook already covered.
+
+    The GitHub rate limit is rationed: each pass only makes as many requests as keep
+    the remaining ones spread evenly until the limit resets, split evenly between the
+    shards. Every repository is charged the requests it is expected to make (see
+    `get_expected_requests`), and when the due repositories cost more than that, the
+    ones with the highest `get_sync_priority` go first.
+
+    Args:
+        shard_index (int): The index of the shard of repositories to synchronize.
+        shard_count (int): The number of shards the repositories are split into.
+        keep_alive: A function called before saving every repository, such as one that
+                    renews the lock of the shard, that returns False when the pass must stop.
+    """
+    logger.info('Synchronization started')
+
+    now = datetime.now(UTC)
+    subscribers = select(func.count()).where(UserRepoModel.repo_id == RepoModel.id).scalar_subquery()
+    activity = select(func.coalesce(func.sum(EventStatsModel.event_count), 0)).where(
+        EventStatsModel.repository_id == RepoModel.id
+    ).scalar_subquery()
+    stats_first_event_at = select(func.min(EventStatsModel.first_event_at)).where(
+        EventStatsModel.repository_id == RepoModel.id
+    ).scalar_subquery()
+    stats_last_event_at = select(func.max(EventStatsModel.last_event_at)).where(
+        EventStatsModel.repository_id == RepoModel.id
+    ).scalar_subquery()
+    repos_to_sync = RepoModel.query.with_entities(
+        RepoModel.id, RepoModel.name, RepoModel.etag, RepoModel.last_modified, RepoModel.last_event_id,
+        RepoModel.retention_policy, RepoModel.retention_limit, RepoModel.next_sync_at, RepoModel.stats_updated_at,
+        RepoModel.webhook_first_delivered_at, RepoModel.webhook_delivered_at, RepoModel.last_synced,
+        RepoModel.sync_failures,
+        subscribers.label('subscribers'), activity.label('activity'),
+        stats_first_event_at.label('stats_first_event_at'), stats_last_event_at.label('stats_last_event_at'),
+    ).filter(
+        (RepoModel.next_sync_at == None) | (RepoModel.next_sync_at <= now)
+    ).filter(
+        (RepoModel.webhook_delivered_at == None)
+        | (RepoModel.webhook_delivered_at < now - timedelta(seconds=current_app.config['WEBHOOK_STALE_AFTER']))
+    )
+    if shard_count > 1:
+        repos_to_sync = repos_to_sync.filter(RepoModel.id % shard_count == shard_index)
+    repos_to_sync = repos_to_sync.all()
+    db.session.commit()
+
     if not repos_to_sync:
         logger.debug('No repositories to update')
         return
 
-    for repo in repos_to_sync:
-        response, status_code = get_events(repo.name)
+    min_interval = current_app.config['SYNC_MIN_INTERVAL']
+    max_interval = current_app.config['SYNC_MAX_INTERVAL']
+    events_per_poll = current_app.config['SYNC_EVENTS_PER_POLL']
+    budget = github_client.rate_limit.get_budget(current_app.config['SYNC_PASS_INTERVAL'])
+    if budget is not None:
+        # The shards share the tokens, and each of them only sees its own requests
+        budget //= shard_count
+    if budget is not None:
+        naive_now = now.replace(tzinfo=None)
+        costs = {repo.id: get_expected_requests(repo, naive_now) for repo in repos_to_sync}
+        if sum(costs.values()) > budget:
+            repos_to_sync.sort(key=lambda repo: get_sync_priority(repo, naive_now, min_interval), reverse=True)
+            selected_repos = []
+            remaining_budget = budget
+            for repo in repos_to_sync:
+                # The most urgent repository goes even if it costs more than a whole pass,
+                # so that it is not postponed forever
+                if costs[repo.id] > remaining_budget and (selected_repos or budget == 0):
+                    break
+                selected_repos.append(repo)
+                remaining_budget -= costs[repo.id]
+            logger.info(f'GitHub rate limit allows {budget} requests, '
+                        f'{len(repos_to_sync) - len(selected_repos)} repositories are postponed')
+            repos_to_sync = selected_repos
+
+    repos_by_name = {repo.name: repo for repo in repos_to_sync}
+    request_args = {
+        repo.name: {"etag": repo.etag, "last_modified": repo.last_modified, "last_event_id": repo.last_event_id}
+        for repo in repos_to_sync
+    }
+    max_workers = current_app.config['SYNC_MAX_WORKERS']
+    default_retention_policy = current_app.config['RETENTION_POLICY']
+    default_retention_limit = current_app.config['RETENTION_LIMIT']
+
+    for repo_name, response, status_code, cache_headers in get_events_concurrently(request_args, max_workers):
+        if keep_alive is not None and not keep_alive():
+            logger.warning('Synchronization was stopped before the end of the pass')
+            break
+        repo = repos_by_name[repo_name]
+        sync_repositories.inc(status=status_code)
+        last_synced = datetime.now(UTC)
+        repo_values = {"last_synced": last_synced}
+        statistics_refreshed = False
 
         if status_code == 200:
-            logger.debug(f'{repo.name} events were received')
-            for event in response:
-                save_new_event(event, repo)
-            delete_extra_events(repo.id)
-            repo.last_synced = datetime.now(UTC)
+            events = response
+            if repo.webhook_first_delivered_at is not None:
+                # Events from the first to the last webhook delivery since the previous poll
+                # were already received through the webhook
+                first_delivered_at = repo.webhook_first_delivered_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+                delivered_at = repo.webhook_delivered_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+                events = [
+                    event for event in response
+                    if not first_delivered_at <= event['created_at'] <= delivered_at
+                ]
+                # Unless another delivery arrived during the request, the next deliveries start anew
+                repo_values["webhook_first_delivered_at"] = case(
+                    (RepoModel.webhook_delivered_at == repo.webhook_delivered_at, None),
+                    else_=RepoModel.webhook_first_delivered_at,
+                )
+            retention_policy, retention_limit = get_retention(repo, default_retention_policy, default_retention_limit)
+            saved_events, statistics_refreshed = ingest_events(
+                repo.id,
+                events,
+                retention_policy=retention_policy,
+                retention_limit=retention_limit,
+                refresh_statistics=repo.stats_updated_at is None,
+            )
+            logger.debug(f'{repo_name} events were received, {saved_events} new')
+            events_ingested.inc(saved_events, source='poll')
+            repo_values["etag"] = cache_headers['etag']
+            repo_values["last_modified"] = cache_headers['last_modified']
+            if response:
+                newest_event = max(response, key=lambda event: int(event['id']))
+                repo_values["last_event_id"] = int(newest_event['id'])
+                repo_values["last_event_at"] = datetime.strptime(newest_event['created_at'], "%Y-%m-%dT%H:%M:%SZ")
+        elif status_code == 304:
+            logger.debug(f'{repo_name} has no new events')
+        elif status_code == 429:
+            # The repository stays due and is retried once the rate limit is lifted
+            logger.warning(f'Events of {repo_name} were not received because of the GitHub rate limit')
+            continue
         else:
-            logger.error(f'Error while receiving new events for {repo.name}: {response}')
+            sync_failures = (repo.sync_failures or 0) + 1
+            retry_interval = get_retry_interval(sync_failures, min_interval, max_interval)
+            logger.error(f'Error while receiving new events for {repo_name}: {response}, '
+                         f'retrying in {retry_interval:.0f} seconds')
+            db.session.execute(update(RepoModel).where(RepoModel.id == repo.id).values(
+                sync_failures=sync_failures,
+                next_sync_at=datetime.now(UTC) + timedelta(seconds=retry_interval),
+            ))
+            db.session.commit()
+            continue
+
+        sync_interval = max(
+            get_sync_interval(repo.id, last_synced, min_interval, max_interval, events_per_poll),
+            cache_headers['poll_interval'] or 0,
+        )
+        repo_values["next_sync_at"] = last_synced + timedelta(seconds=sync_interval)
+        repo_values["sync_failures"] = None
+        db.session.execute(update(RepoModel).where(RepoModel.id == repo.id).values(**repo_values))
+        db.session.commit()
+        if statistics_refreshed:
+            stats_cache.invalidate(repo_name)
 
-    db.session.commit()
     db.session.close()
+    logger.debug(f'GitHub connections: {github_client.get_connection_metrics()}')
     logger.info('Synchronization was completed successfully')
 
-def convert_events_to_df(repo_name: str) -> pd.DataFrame:
+def queue_webhook_event(event: dict, repo_id: int) -> bool:
     """
-    Converts the events for the given repository from the database to a pandas DataFrame.
+    Queues an event received through a GitHub webhook for ingestion by the sync worker,
+    and records the delivery on the repository.
 
     Args:
-        repo_name (str): The name of the repository.
+        event (dict): The event data, in the shape of the GitHub events API.
+        repo_id (int): The ID of the repository associated with the event.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the events data for the repository.
+        bool: True if the event was queued, False if it was already delivered.
     """
-    query = f"""
-    SELECT event.id, repository.name, event.type, event.created_at
-    FROM event JOIN repository
-    ON event.repository_id = repository.id
-    WHERE repository.name = '{repo_name}'
-    ORDER BY created_at DESC
+    now = datetime.now(UTC)
+    row = {
+        "id": int(event['id']),
+        "type": event['type'],
+        "created_at": datetime.strptime(event['created_at'], "%Y-%m-%dT%H:%M:%SZ"),
+        "repository_id": repo_id,
+    }
+    statement = dialect_insert(PendingEventModel).values(row).on_conflict_do_nothing(index_elements=['id'])
+
+    queued = db.session.execute(statement).rowcount > 0
+    db.session.execute(update(RepoModel).where(RepoModel.id == repo_id).values(
+        webhook_first_delivered_at=func.coalesce(RepoModel.webhook_first_delivered_at, now),
+        webhook_delivered_at=now,
+    ))
+    db.session.commit()
+    return queued
+
+def ingest_webhook_events(batch_size: int = 1000) -> int:
     """
-    df = pd.read_sql_query(
-        sql=query,
-        con=db.engine
-    )
+    Moves the queued webhook events into the events table, one transaction per repository,
+    through the same bulk ingestion as synchronization.
+
+    Args:
+        batch_size (int): The maximum number of queued events to ingest.
+
+    Returns:
+        int: The number of new events saved.
+    """
+    pending_events = PendingEventModel.query.order_by(PendingEventModel.created_at).limit(batch_size).all()
+    if not pending_events:
+        return 0
+
+    events_by_repo = {}
+    for pending_event in pending_events:
+        events_by_repo.setdefault(pending_event.repository_id, []).append({
+            "id": pending_event.id,
+            "type": pending_event.type,
+            "created_at": pending_event.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+    repos = RepoModel.query.with_entities(
+        RepoModel.id, RepoModel.name, RepoModel.retention_policy, RepoModel.retention_limit
+    ).filter(RepoModel.id.in_(events_by_repo)).all()
+    db.session.commit()
+
+    saved_events = 0
+    for repo in repos:
+        events = events_by_repo[repo.id]
+        retention_policy, retention_limit = get_retention(
+            repo, current_app.config['RETENTION_POLICY'], current_app.config['RETENTION_LIMIT']
+        )
+        repo_saved_events, statistics_refreshed = ingest_events(
+            repo.id,
+            events,
+            retention_policy=retention_policy,
+            retention_limit=retention_limit,
+        )
+        saved_events += repo_saved_events
+        db.session.execute(delete(PendingEventModel).where(PendingEventModel.id.in_([event['id'] for event in events])))
+        db.session.execute(update(RepoModel).where(RepoModel.id == repo.id).values(last_synced=datetime.now(UTC)))
+        db.session.commit()
+        if statistics_refreshed:
+            stats_cache.invalidate(repo.name)
+
     db.session.close()
-    return df
+    events_ingested.inc(saved_events, source='webhook')
+    logger.debug(f'{saved_events} new events were received through webhooks')
+    return saved_events
@@ -0,0 +1,59 @@
+import logging
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from database.models import SyncLockModel
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+def acquire_lock(name: str, owner: str, ttl: int) -> bool:
+    """
+    Acquires or renews a lock shared through the database, so that only one of several
+    processes does a job. The lock is a lease: if its owner stops renewing it, another
+    process takes it over once it expires.
+
+    Args:
+        name (str): The name of the lock.
+        owner (str): A unique identifier of the calling process.
+        ttl (int): How long the lock is held without renewing it, in seconds.
+
+    Returns:
+        bool: True if the caller holds the lock, False if another process does.
+    """
+    now = datetime.now(UTC)
+    expires_at = now + timedelta(seconds=ttl)
+
+    renewed = db.session.execute(
+        update(SyncLockModel)
+        .where(SyncLockModel.name == name)
+        .where((SyncLockModel.owner == owner) | (SyncLockModel.expires_at < now))
+        .values(owner=owner, expires_at=expires_at)
+    ).rowcount
+    if renewed:
+        db.session.commit()
+        return True
+
+    try:
+        db.session.execute(insert(SyncLockModel).values(name=name, owner=owner, expires_at=expires_at))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    logger.info(f'Lock {name} was acquired by {owner}')
+    return True
+
+
+def release_lock(name: str, owner: str) -> None:
+    """
+    Releases a lock if it is held by the given owner.
+
+    Args:
+        name (str): The name of the lock.
+        owner (str): The identifier the lock was acquired with.
+    """
+    db.session.execute(delete(SyncLockModel).where(SyncLockModel.name == name, SyncLockModel.owner == owner))
+    db.session.commit()
@@ -0,0 +1,129 @@
+import logging
+
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+
+from . import db
+from .models import EventModel, EventStatsModel, RepoModel, UserRepoModel
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns() -> None:
+    """
+    Adds columns that exist in the models but not in the database tables.
+
+    `db.create_all` only creates missing tables, so databases created by an older
+    version of the application lack the columns added since. New columns are
+    always nullable, so they can be added in place without rebuilding the table.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                logger.info(f'Column {table.name}.{column.name} was added')
+
+
+def merge_duplicate_repositories() -> None:
+    """
+    Merges repositories that share a name into the one added first.
+
+    Repository names were not unique before, and the unique index on them cannot be
+    created while duplicates exist. The events and user links of the duplicates are
+    moved to the remaining repository, whose statistics are recomputed on next read.
+    """
+    with db.engine.begin() as connection:
+        duplicated_names = connection.execute(
+            select(RepoModel.name).group_by(RepoModel.name).having(func.count() > 1)
+        ).scalars().all()
+
+        for name in duplicated_names:
+            repo_id, *duplicate_ids = connection.execute(
+                select(RepoModel.id).where(RepoModel.name == name).order_by(RepoModel.id)
+            ).scalars().all()
+
+            linked_user_ids = set(connection.execute(
+                select(UserRepoModel.user_id).where(UserRepoModel.repo_id == repo_id)
+            ).scalars())
+            for user_id, duplicate_id in connection.execute(
+                select(UserRepoModel.user_id, UserRepoModel.repo_id).where(UserRepoModel.repo_id.in_(duplicate_ids))
+            ).all():
+                if user_id not in linked_user_ids:
+                    connection.execute(insert(UserRepoModel).values(user_id=user_id, repo_id=repo_id))
+                    linked_user_ids.add(user_id)
+
+            connection.execute(delete(UserRepoModel).where(UserRepoModel.repo_id.in_(duplicate_ids)))
+            connection.execute(
+                update(EventModel).where(EventModel.repository_id.in_(duplicate_ids)).values(repository_id=repo_id)
+            )
+            connection.execute(
+                delete(EventStatsModel).where(EventStatsModel.repository_id.in_([repo_id, *duplicate_ids]))
+            )
+            connection.execute(update(RepoModel).where(RepoModel.id == repo_id).values(stats_updated_at=None))
+            connection.execute(delete(RepoModel).where(RepoModel.id.in_(duplicate_ids)))
+            logger.info(f'Repositories {duplicate_ids} were merged into {repo_id} ({name})')
+
+
+def widen_event_ids() -> None:
+    """
+    Widens the event IDs to 64-bit integers on PostgreSQL.
+
+    GitHub event IDs and the IDs of webhook events don't fit in the 32-bit `integer`
+    the column was created with. SQLite integers are always 64-bit.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table_name in ('event', 'pending_event'):
+        if table_name not in existing_tables:
+            continue
+        id_column = next(column for column in inspector.get_columns(table_name) if column['name'] == 'id')
+        if id_column['type'].python_type is int and not isinstance(id_column['type'], db.BigInteger):
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE "{table_name}" ALTER COLUMN "id" TYPE BIGINT'))
+            logger.info(f'Column {table_name}.id was widened to BIGINT')
+
+
+# Indexes replaced by wider ones, that only slow down writes
+OBSOLETE_INDEXES = {'event': ['ix_event_repository_id_created_at']}
+
+
+def create_missing_indexes() -> None:
+    """
+    Creates the indexes that exist in the models but not in the database, and drops
+    the obsolete ones.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+        for table_name, index_names in OBSOLETE_INDEXES.items():
+            if table_name not in existing_tables:
+                continue
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table_name)}
+            for index_name in index_names:
+                if index_name in existing_indexes:
+                    connection.execute(text(f'DROP INDEX "{index_name}"'))
+                    logger.info(f'Index {index_name} was dropped')
+
+
+def upgrade_schema() -> None:
+    """
+    Brings an existing database up to date with the current models.
+    """
+    add_missing_columns()
+    widen_event_ids()
+    merge_duplicate_repositories()
+    create_missing_indexes()
@@ -20,8 +20,20 @@ class RepoModel(db.Model):
     __tablename__ = 'repository'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(150), nullable=False)
+    name = db.Column(db.String(150), nullable=False, unique=True, index=True)
     last_synced = db.Column(db.DateTime, nullable=True)
+    next_sync_at = db.Column(db.DateTime, nullable=True, index=True)
+    etag = db.Column(db.String(150), nullable=True)
+    last_modified = db.Column(db.String(50), nullable=True)
+    last_event_id = db.Column(db.BigInteger, nullable=True)
+    last_event_at = db.Column(db.DateTime, nullable=True)
+    retention_policy = db.Column(db.String(10), nullable=True)
+    retention_limit = db.Column(db.Integer, nullable=True)
+    stats_updated_at = db.Column(db.DateTime, nullable=True)
+    stats_expires_at = db.Column(db.DateTime, nullable=True)
+    webhook_first_delivered_at = db.Column(db.DateTime, nullable=True)
+    webhook_delivered_at = db.Column(db.DateTime, nullable=True)
+    sync_failures = db.Column(db.Integer, nullable=True)
 
     users = db.relationship('UserModel', secondary='user_repository', back_populates='repos')
     events = db.relationship('EventModel', backref='repository')
@@ -35,16 +47,46 @@ class UserRepoModel(db.Model):
     __tablename__ = 'user_repository'
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
-    repo_id = db.Column(db.Integer, db.ForeignKey('repository.id'), primary_key=True)
+    repo_id = db.Column(db.Integer, db.ForeignKey('repository.id'), primary_key=True, index=True)
 
 
 class EventModel(db.Model):
     __tablename__ = 'event'
+    __table_args__ = (
+        # Covers the type too, so the statistics queries never read the table itself
+        db.Index('ix_event_repository_id_created_at_type', 'repository_id', 'created_at', 'type'),
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
     type = db.Column(db.String)
     created_at = db.Column('created_at', db.DateTime)
 
     repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), nullable=False)
 
-    
\ No newline at end of file
+
+class EventStatsModel(db.Model):
+    __tablename__ = 'event_statistics'
+
+    repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), primary_key=True)
+    type = db.Column(db.String, primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False)
+    delta_sum = db.Column(db.Float, nullable=False)
+    first_event_at = db.Column(db.DateTime, nullable=False)
+    last_event_at = db.Column(db.DateTime, nullable=False)
+
+
+class SyncLockModel(db.Model):
+    __tablename__ = 'sync_lock'
+
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(150), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class PendingEventModel(db.Model):
+    __tablename__ = 'pending_event'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    type = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), nullable=False)
@@ -0,0 +1,201 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    values = ','.join(
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + values + '}'
+
+
+class Metric:
+    """
+    A metric with a value for every combination of its labels, in the Prometheus text format.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple): The names of the labels of the metric.
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(dict(zip(self.labelnames, key)), value))
+        return lines
+
+    def _render_value(self, labels: dict, value) -> list:
+        return [f'{self.name}{format_labels(labels)} {value}']
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Counts the observed values in cumulative buckets, see `Metric`.
+
+    Args:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of a block of code or of every call of a decorated function, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, labels: dict, value) -> list:
+        counts, total = value
+        lines = []
+        cumulative_count = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative_count += count
+            lines.append(f'{self.name}_bucket{format_labels({**labels, "le": bound})} {cumulative_count}')
+        lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+        lines.append(f'{self.name}_count{format_labels(labels)} {cumulative_count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the process and renders them in the Prometheus text format.
+
+    Callbacks registered with `add_callback` run before every rendering, to update
+    the metrics that are read from the state of the process rather than recorded.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.callbacks = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_callback(self, callback) -> None:
+        self.callbacks.append(callback)
+
+    def render(self) -> str:
+        for callback in self.callbacks:
+            callback()
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Duration of the API requests.', ('endpoint', 'method', 'status')
+))
+github_request_duration = registry.register(Histogram(
+    'github_request_duration_seconds', 'Duration of the GitHub API requests.', ('endpoint', 'status')
+))
+github_rate_limit_remaining = registry.register(Gauge(
+    'github_rate_limit_remaining', 'Requests left until the GitHub rate limit resets.', ('token',)
+))
+events_ingested = registry.register(Counter(
+    'events_ingested_total', 'New events saved to the database.', ('source',)
+))
+sync_duration = registry.register(Histogram(
+    'sync_pass_duration_seconds', 'Duration of the synchronization passes.',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+))
+sync_repositories = registry.register(Counter(
+    'sync_repositories_total', 'Repositories synchronized, by the HTTP status of their events request.', ('status',)
+))
+stats_duration = registry.register(Histogram(
+    'stats_computation_duration_seconds', 'Duration of the event statistics computations.', ('kind',)
+))
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """
+    Serves the metrics on `/metrics` from a background thread, for processes without
+    the API such as the sync worker.
+
+    Args:
+        port (int): The port to listen on.
+        host (str): The address to listen on.
+
+    Returns:
+        ThreadingHTTPServer: The server, stopped with `shutdown`.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,23 +1,34 @@
 import logging
+import os
+import socket
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from app import create_app
-from database.functions import synchronize_db_events
+from worker import ingest_webhooks, sync_shard
 
 app = create_app()
 
 logger = logging.getLogger(__name__)
 
 def scheduled_task():
-    with app.app_context():
-        synchronize_db_events()
+    sync_shard(app, owner=f'{socket.gethostname()}:{os.getpid()}')
 
 if __name__ == '__main__':
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(func=scheduled_task, trigger="interval", seconds=60)
-    scheduler.start()
-    logger.info("Scheduler started")
+    scheduler = None
+    if os.getenv("SYNC_IN_API", "false").lower() == "true":
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(func=scheduled_task, trigger="interval", seconds=app.config['SYNC_PASS_INTERVAL'])
+        scheduler.add_job(
+            func=ingest_webhooks,
+            args=(app, f'{socket.gethostname()}:{os.getpid()}'),
+            trigger="interval",
+            seconds=app.config['WEBHOOK_INGEST_INTERVAL'],
+        )
+        scheduler.start()
+        logger.info("Scheduler started")
     try:
         app.run(debug=True)
     except (KeyboardInterrupt, SystemExit):
-        scheduler.shutdown()
-        logger.info("Scheduler shutdown")
+        if scheduler:
+            scheduler.shutdown()
+            logger.info("Scheduler shutdown")
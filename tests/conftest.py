@@ -0,0 +1,19 @@
+import pytest
+
+from app import create_app
+from database import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'RATELIMIT_ENABLED': False,
+        'PASSWORD_HASH_WORKERS': 0,
+        'LOG_FILE': '',
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
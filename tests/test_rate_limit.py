@@ -0,0 +1,44 @@
+import time
+
+from api_requests.rate_limit import SECONDARY_RATE_LIMIT_WAIT, RateLimitGovernor, TokenPool, is_rate_limit_response
+
+SECONDARY_RATE_LIMIT_MESSAGE = (
+    '{"message": "You have exceeded a secondary rate limit. Please wait a few minutes before you try again."}'
+)
+
+
+def test_secondary_rate_limit_pauses_requests():
+    governor = RateLimitGovernor()
+
+    governor.update(403, {'X-RateLimit-Remaining': '4000', 'X-RateLimit-Reset': str(int(time.time()) + 3600)},
+                    SECONDARY_RATE_LIMIT_MESSAGE)
+
+    assert governor.is_blocked()
+    assert governor.get_state()['blocked_until'] >= time.time() + SECONDARY_RATE_LIMIT_WAIT - 1
+
+
+def test_other_forbidden_responses_do_not_pause_requests():
+    governor = RateLimitGovernor()
+
+    governor.update(403, {'X-RateLimit-Remaining': '4000'}, '{"message": "Repository access blocked"}')
+
+    assert not governor.is_blocked()
+    assert not is_rate_limit_response(403, {'X-RateLimit-Remaining': '4000'}, '{"message": "Forbidden"}')
+
+
+def test_primary_rate_limit_pauses_requests_until_reset():
+    governor = RateLimitGovernor()
+    reset_at = int(time.time()) + 600
+
+    governor.update(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset_at)},
+                    '{"message": "API rate limit exceeded"}')
+
+    assert governor.is_blocked()
+    assert governor.get_state()['blocked_until'] == reset_at
+
+
+def test_token_states_do_not_expose_tokens():
+    pool = TokenPool(['ghp_first0000', 'ghp_second1111'])
+
+    assert list(pool.get_state()) == ['token-0', 'token-1']
+    assert list(TokenPool([]).get_state()) == ['anonymous']
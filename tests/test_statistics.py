@@ -0,0 +1,196 @@
+import random
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from calculations import calculations
+from database import db
+from database import functions
+from database.functions import STATS_WINDOW_DAYS, STATS_WINDOW_EVENTS, get_events_statistics
+from database.models import EventModel, RepoModel
+
+EVENT_TYPES = ('PushEvent', 'IssuesEvent', 'PullRequestEvent', 'WatchEvent')
+DAY = 24 * 60 * 60
+WEEK = STATS_WINDOW_DAYS * DAY
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Moves the current time of the statistics functions forward by `clock.offset`.
+    """
+    class Clock(datetime):
+        offset = timedelta()
+
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + cls.offset
+
+    monkeypatch.setattr(functions, 'datetime', Clock)
+    monkeypatch.setattr(calculations, 'datetime', Clock)
+    return Clock
+
+
+def utc_now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+
+
+def add_repository(name: str, events: list) -> int:
+    """
+    Adds a repository with events given as (age in seconds, type) pairs, and returns its ID.
+    """
+    repo = RepoModel(name=name, last_synced=utc_now())
+    db.session.add(repo)
+    db.session.flush()
+    first_id = db.session.query(db.func.coalesce(db.func.max(EventModel.id), 0)).scalar() + 1
+    now = utc_now()
+    if events:
+        db.session.execute(insert(EventModel), [
+            {
+                'id': first_id + i,
+                'type': event_type,
+                'created_at': now - timedelta(seconds=age),
+                'repository_id': repo.id,
+            }
+            for i, (age, event_type) in enumerate(events)
+        ])
+    db.session.commit()
+    return repo.id
+
+
+def random_events(count: int, min_age: float, max_age: float, seed: int) -> list:
+    generator = random.Random(seed)
+    return [(generator.uniform(min_age, max_age), generator.choice(EVENT_TYPES)) for _ in range(count)]
+
+
+def assert_matches_reference(repo_id: int) -> dict:
+    """
+    Checks the precomputed statistics of a repository against the ones calculated
+    from its events, and returns them.
+    """
+    repo = db.session.get(RepoModel, repo_id)
+    statistics = get_events_statistics([repo])[repo_id]
+    assert statistics == pytest.approx(calculations.calculate_events_statistics(repo.name), abs=2e-3)
+    return statistics
+
+
+@pytest.mark.parametrize('events', [
+    pytest.param([], id='no events'),
+    pytest.param([(DAY, 'PushEvent')], id='single event'),
+    pytest.param(random_events(100, 60, WEEK - 60, seed=1), id='last week only'),
+    pytest.param(
+        random_events(300, 60, WEEK - 60, seed=2) + random_events(400, WEEK + 60, 3 * WEEK, seed=3)
+        + [(WEEK - 60, 'ForkEvent'), (WEEK + 60, 'ForkEvent')],
+        id='both sides of a week',
+    ),
+    pytest.param(
+        random_events(STATS_WINDOW_EVENTS, 60, WEEK - 60, seed=4) + random_events(100, WEEK + 60, 2 * WEEK, seed=5),
+        id='500 events in the last week',
+    ),
+    pytest.param(
+        random_events(STATS_WINDOW_EVENTS + 1, 60, WEEK - 60, seed=6) + random_events(100, WEEK + 60, 2 * WEEK, seed=7),
+        id='501 events in the last week',
+    ),
+    pytest.param(random_events(900, 60, WEEK - 60, seed=8), id='busy last week'),
+    pytest.param(random_events(20, WEEK + 60, 2 * WEEK, seed=9), id='few old events'),
+    pytest.param(random_events(700, WEEK + 60, 4 * WEEK, seed=10), id='many old events'),
+])
+def test_precomputed_statistics_match_calculation(app, events):
+    repo_id = add_repository('owner/repo', events)
+
+    assert_matches_reference(repo_id)
+
+
+# Averages returned by the original pandas implementation for the same events
+BASELINE_CASES = [
+    pytest.param(
+        [
+            (120, 'PushEvent'), (1000, 'PushEvent'), (4600, 'PushEvent'), (90000, 'PushEvent'),
+            (300000, 'PushEvent'), (700000, 'PushEvent'), (900000, 'PushEvent'),
+            (5000, 'IssuesEvent'), (5500, 'IssuesEvent'), (259217, 'IssuesEvent'),
+            (200000, 'WatchEvent'), (650000, 'WatchEvent'),
+            (800000, 'ForkEvent'), (810000, 'ForkEvent'),
+        ],
+        {'IssuesEvent': 127108.5, 'PushEvent': 74970.0, 'WatchEvent': 0.0},
+        id='last week',
+    ),
+    pytest.param(
+        [
+            (60 + i * 900 + i * 37 % 101, ('PushEvent', 'IssuesEvent', 'PullRequestEvent')[i * 7 % 11 % 3])
+            for i in range(600)
+        ] + [(600000, 'ForkEvent')],
+        {'IssuesEvent': 2471.309, 'PullRequestEvent': 3277.44, 'PushEvent': 2468.027},
+        id='500 newest events',
+    ),
+]
+
+
+@pytest.mark.parametrize('events, expected', BASELINE_CASES)
+def test_precomputed_statistics_match_pandas_baseline(app, events, expected):
+    repo_id = add_repository('owner/repo', events)
+    repo = db.session.get(RepoModel, repo_id)
+
+    assert get_events_statistics([repo])[repo_id] == pytest.approx(expected, abs=2e-3)
+
+
+def test_statistics_of_many_repositories_are_precomputed_together(app):
+    repo_ids = [
+        add_repository('owner/quiet', random_events(50, 60, WEEK - 60, seed=11)),
+        add_repository('owner/busy', random_events(800, 60, WEEK - 60, seed=12)),
+        add_repository('owner/old', random_events(600, WEEK + 60, 3 * WEEK, seed=13)),
+    ]
+    repos = RepoModel.query.filter(RepoModel.id.in_(repo_ids)).all()
+
+    statistics = get_events_statistics(repos)
+
+    for repo_id in repo_ids:
+        assert statistics[repo_id] == assert_matches_reference(repo_id)
+
+
+def test_statistics_expire_when_last_week_events_get_old(app, clock):
+    # The two ForkEvent events leave the last week one hour and two hours from now
+    repo_id = add_repository(
+        'owner/repo',
+        random_events(50, DAY, 5 * DAY, seed=14) + [(WEEK - 3600, 'ForkEvent'), (WEEK - 7200, 'ForkEvent')],
+    )
+
+    statistics = assert_matches_reference(repo_id)
+    repo = db.session.get(RepoModel, repo_id)
+    oldest_event = EventModel.query.filter_by(repository_id=repo_id).order_by(EventModel.created_at).first()
+    assert statistics['ForkEvent'] == pytest.approx(3600)
+    assert repo.stats_expires_at == oldest_event.created_at + timedelta(days=STATS_WINDOW_DAYS)
+    updated_at = repo.stats_updated_at
+
+    clock.offset = timedelta(minutes=30)
+    assert_matches_reference(repo_id)
+    assert db.session.get(RepoModel, repo_id).stats_updated_at == updated_at
+
+    clock.offset = timedelta(minutes=90)
+    statistics = assert_matches_reference(repo_id)
+    assert statistics['ForkEvent'] == 0.0
+    assert db.session.get(RepoModel, repo_id).stats_updated_at > updated_at
+
+    clock.offset = timedelta(hours=3)
+    statistics = assert_matches_reference(repo_id)
+    assert 'ForkEvent' not in statistics
+
+
+def test_statistics_expire_when_busy_repository_gets_quiet(app, clock):
+    repo_id = add_repository(
+        'owner/repo',
+        random_events(STATS_WINDOW_EVENTS, 60, 3 * DAY, seed=15) + random_events(200, 5 * DAY, 6 * DAY, seed=16),
+    )
+
+    assert_matches_reference(repo_id)
+    repo = db.session.get(RepoModel, repo_id)
+    # The window switches to the last week when the 501st newest event leaves it
+    event_501 = EventModel.query.filter_by(repository_id=repo_id).order_by(
+        EventModel.created_at.desc()
+    ).offset(STATS_WINDOW_EVENTS).first()
+    assert repo.stats_expires_at == event_501.created_at + timedelta(days=STATS_WINDOW_DAYS)
+    updated_at = repo.stats_updated_at
+
+    clock.offset = timedelta(days=5)
+    assert_matches_reference(repo_id)
+    assert db.session.get(RepoModel, repo_id).stats_updated_at > updated_at
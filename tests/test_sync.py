@@ -0,0 +1,101 @@
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import update
+
+from api_requests.github_requests import MAX_EVENTS_PAGES
+from cache.stats_cache import stats_cache
+from database import db
+from database import functions
+from database.functions import (
+    get_events_statistics,
+    get_expected_requests,
+    get_retention,
+    get_retry_interval,
+    synchronize_db_events,
+)
+from database.models import RepoModel
+
+NOW = datetime(2024, 12, 1, 12, 0, 0)
+
+
+def make_repo(**values) -> SimpleNamespace:
+    """
+    Builds a repository row as selected by `synchronize_db_events`, with one event a minute.
+    """
+    row = {
+        'last_event_id': 1,
+        'last_synced': NOW - timedelta(hours=1),
+        'activity': 61,
+        'stats_first_event_at': NOW - timedelta(hours=2),
+        'stats_last_event_at': NOW - timedelta(hours=1),
+    }
+    row.update(values)
+    return SimpleNamespace(**row)
+
+
+def test_repository_without_cursor_reads_all_pages():
+    assert get_expected_requests(make_repo(last_event_id=None), NOW) == MAX_EVENTS_PAGES
+
+
+def test_quiet_repository_costs_one_request():
+    assert get_expected_requests(make_repo(activity=0, stats_first_event_at=None, stats_last_event_at=None), NOW) == 1
+    assert get_expected_requests(make_repo(activity=1), NOW) == 1
+
+
+def test_requests_grow_with_expected_events():
+    # 60 new events fit in the first page
+    assert get_expected_requests(make_repo(), NOW) == 1
+    # 300 new events fill three pages, and the fourth one reaches a known event
+    assert get_expected_requests(make_repo(last_synced=NOW - timedelta(hours=5)), NOW) == 4
+    assert get_expected_requests(make_repo(last_synced=NOW - timedelta(days=30)), NOW) == MAX_EVENTS_PAGES
+
+
+def test_retention_overrides_of_a_repository():
+    repo = SimpleNamespace(name='owner/repo', retention_policy=None, retention_limit=None)
+    assert get_retention(repo, 'count', 500) == ('count', 500)
+
+    repo = SimpleNamespace(name='owner/repo', retention_policy='days', retention_limit=0)
+    assert get_retention(repo, 'count', 500) == ('days', 0)
+
+
+def test_invalid_retention_override_falls_back_to_defaults(caplog):
+    for policy, limit in (('weeks', 10), ('count', -1)):
+        repo = SimpleNamespace(name='owner/repo', retention_policy=policy, retention_limit=limit)
+        assert get_retention(repo, 'count', 500) == ('count', 500)
+    assert 'Invalid retention policy' in caplog.text
+
+
+def test_failed_repositories_back_off_exponentially():
+    intervals = [get_retry_interval(failures, 60, 3600) for failures in range(1, 10)]
+
+    assert intervals[:4] == [60, 120, 240, 480]
+    assert intervals[-1] == 3600
+    assert get_retry_interval(1000, 60, 3600) == 3600
+
+
+def test_cached_statistics_survive_polls_without_new_events(app, monkeypatch):
+    repo = RepoModel(name='owner/repo', last_event_id=1)
+    db.session.add(repo)
+    db.session.commit()
+    repo_id = repo.id
+    stats_cache.set(repo, get_events_statistics([repo])[repo_id])
+
+    cache_headers = {'etag': '"etag"', 'last_modified': None, 'poll_interval': None}
+    responses = [('owner/repo', None, 304, cache_headers)]
+    monkeypatch.setattr(functions, 'get_events_concurrently', lambda repos, max_workers: iter(responses))
+
+    synchronize_db_events()
+
+    repo = db.session.get(RepoModel, repo_id)
+    assert stats_cache.get(repo) == {}
+
+    created_at = datetime.now(UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
+    responses[:] = [('owner/repo', [{'id': '2', 'type': 'PushEvent', 'created_at': created_at}], 200, cache_headers)]
+    db.session.execute(update(RepoModel).where(RepoModel.id == repo_id).values(next_sync_at=None))
+    db.session.commit()
+
+    synchronize_db_events()
+
+    repo = db.session.get(RepoModel, repo_id)
+    assert stats_cache.get(repo) is None
@@ -0,0 +1,63 @@
+from datetime import UTC, datetime, timedelta
+
+from database import db
+from database import functions
+from database.functions import synchronize_db_events
+from database.models import EventModel, RepoModel
+
+
+def github_event(event_id: int, created_at: datetime) -> dict:
+    return {'id': str(event_id), 'type': 'PushEvent', 'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+
+def test_polling_after_webhook_skips_only_delivered_events(app, monkeypatch):
+    app.config['WEBHOOK_STALE_AFTER'] = 3600
+    now = datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+    repo = RepoModel(
+        name='owner/repo',
+        last_event_id=1,
+        webhook_first_delivered_at=now - timedelta(hours=3),
+        webhook_delivered_at=now - timedelta(hours=2),
+    )
+    db.session.add(repo)
+    db.session.commit()
+    repo_id = repo.id
+
+    events = [
+        # Between the previous poll and the first delivery
+        github_event(10, now - timedelta(hours=4)),
+        # Received through the webhook
+        github_event(11, now - timedelta(hours=2, minutes=30)),
+        # After the webhook went quiet
+        github_event(12, now - timedelta(hours=1)),
+    ]
+    cache_headers = {'etag': None, 'last_modified': None, 'poll_interval': None}
+    monkeypatch.setattr(
+        functions, 'get_events_concurrently',
+        lambda repos, max_workers: iter([('owner/repo', events, 200, cache_headers)]),
+    )
+
+    synchronize_db_events()
+
+    saved_ids = {event.id for event in EventModel.query.filter_by(repository_id=repo_id)}
+    assert saved_ids == {10, 12}
+    repo = db.session.get(RepoModel, repo_id)
+    assert repo.webhook_first_delivered_at is None
+    assert repo.last_event_id == 12
+
+
+def test_webhook_delivery_keeps_the_first_delivery_time(app):
+    repo = RepoModel(name='owner/repo')
+    db.session.add(repo)
+    db.session.commit()
+
+    for event_id in (1, 2):
+        functions.queue_webhook_event(github_event(event_id, datetime.now(UTC)), repo.id)
+        db.session.expire_all()
+        if event_id == 1:
+            first_delivered_at = db.session.get(RepoModel, repo.id).webhook_first_delivered_at
+
+    repo = db.session.get(RepoModel, repo.id)
+    assert first_delivered_at is not None
+    assert repo.webhook_first_delivered_at == first_delivered_at
+    assert repo.webhook_delivered_at >= first_delivered_at
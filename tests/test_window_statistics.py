@@ -0,0 +1,35 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import insert
+
+from database import db
+from database.functions import STATS_PERCENTILES, add_user_repo_links
+from database.models import EventModel, RepoModel
+
+
+def test_window_statistics_are_numbers(app):
+    client = app.test_client()
+    response = client.post('/auth/register', json={'username': 'user', 'password': 'password'})
+    headers = {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+    add_user_repo_links(1, ['owner/repo'])
+    repo = RepoModel.query.filter_by(name='owner/repo').one()
+    now = datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+    repo.last_synced = now
+    db.session.execute(insert(EventModel), [
+        {'id': i + 1, 'type': 'PushEvent', 'created_at': now - timedelta(minutes=5 * i + 1), 'repository_id': repo.id}
+        for i in range(10)
+    ])
+    db.session.commit()
+
+    since = (now - timedelta(days=1)).isoformat() + 'Z'
+    response = client.get(
+        f'/repository/stats?since={since}', headers=headers, json={'owner': 'owner', 'name': 'repo'}
+    )
+
+    assert response.status_code == 200
+    statistics = response.get_json()['repositories'][0]['statistics']['PushEvent']
+    assert statistics['event_count'] == 10
+    for name in ['average_delta', *[f'p{percentile}_delta' for percentile in STATS_PERCENTILES]]:
+        assert isinstance(statistics[name], float)
+        assert statistics[name] == 300.0
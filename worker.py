@@ -0,0 +1,103 @@
+import argparse
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from app import create_app
+from database.functions import ingest_webhook_events, synchronize_db_events
+from database.locks import acquire_lock, release_lock
+from metrics.metrics import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+def sync_shard(app, owner: str, shard_index: int = 0, shard_count: int = 1) -> None:
+    """
+    Runs a synchronization pass over one shard of the repositories, if no other process
+    holds the lock of that shard. The lock is renewed during the pass, which stops if
+    it cannot be.
+
+    Args:
+        app: The Flask application.
+        owner (str): A unique identifier of the calling process.
+        shard_index (int): The index of the shard of repositories to synchronize.
+        shard_count (int): The number of shards the repositories are split into.
+    """
+    lock_name = f'sync-{shard_index}-of-{shard_count}'
+    lock_ttl = app.config['SYNC_LOCK_TTL']
+    renewed_at = time.monotonic()
+
+    def renew_lock() -> bool:
+        # Renews the lease during long passes, and stops the pass if another worker took it over
+        nonlocal renewed_at
+        if time.monotonic() - renewed_at < lock_ttl / 3:
+            return True
+        renewed_at = time.monotonic()
+        if not acquire_lock(lock_name, owner, lock_ttl):
+            logger.warning(f'Lock {lock_name} was lost during synchronization')
+            return False
+        return True
+
+    with app.app_context():
+        if not acquire_lock(lock_name, owner, lock_ttl):
+            logger.debug(f'Lock {lock_name} is held by another worker')
+            return
+        synchronize_db_events(shard_index=shard_index, shard_count=shard_count, keep_alive=renew_lock)
+
+def ingest_webhooks(app, owner: str) -> None:
+    """
+    Ingests the queued webhook events, if no other process holds the webhook lock.
+
+    Args:
+        app: The Flask application.
+        owner (str): A unique identifier of the calling process.
+    """
+    with app.app_context():
+        if not acquire_lock('webhooks', owner, app.config['SYNC_LOCK_TTL']):
+            return
+        ingest_webhook_events()
+
+def main():
+    parser = argparse.ArgumentParser(description='Synchronizes the events of the tracked repositories.')
+    parser.add_argument('--shard-index', type=int, default=int(os.getenv('SYNC_SHARD_INDEX', 0)))
+    parser.add_argument('--shard-count', type=int, default=int(os.getenv('SYNC_SHARD_COUNT', 1)))
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', 0)),
+                        help='serve the metrics on this port, disabled if 0')
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error('--shard-index must be between 0 and --shard-count - 1')
+
+    # The worker never hashes passwords
+    app = create_app({'PASSWORD_HASH_WORKERS': 0})
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    scheduler = BlockingScheduler()
+    scheduler.add_job(
+        func=sync_shard,
+        args=(app, owner, args.shard_index, args.shard_count),
+        trigger="interval",
+        seconds=app.config['SYNC_PASS_INTERVAL'],
+        next_run_time=datetime.now(),
+    )
+    scheduler.add_job(
+        func=ingest_webhooks,
+        args=(app, owner),
+        trigger="interval",
+        seconds=app.config['WEBHOOK_INGEST_INTERVAL'],
+    )
+    logger.info(f"Sync worker {owner} started for shard {args.shard_index} of {args.shard_count}")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        with app.app_context():
+            release_lock(f'sync-{args.shard_index}-of-{args.shard_count}', owner)
+            release_lock('webhooks', owner)
+        logger.info("Sync worker shutdown")
+
+if __name__ == '__main__':
+    main()